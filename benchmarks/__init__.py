@@ -0,0 +1,5 @@
+# -*- coding: utf-8 -*-
+"""Performance benchmarks
+
+Run with `paver bench [fetch|render]' or `python -m benchmarks.bench_<name>'.
+"""
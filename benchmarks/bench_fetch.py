@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Fetch pipeline benchmark
+Drives CloudManager.load_list and the fetch workers against a fake extractor
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+
+from soundground import metadata, credman
+from soundground.cache import MetadataCache
+from soundground.cloudman import CloudManager
+from benchmarks.fakes import FakeExtractor, FakeList
+from benchmarks.report import save_results, compare, print_changes
+
+RESULTS_DIRECTORY = os.path.join(os.path.dirname(__file__), 'results')
+
+def percentile(values, fraction):
+    """
+    Returns the value below which the given fraction of values fall
+    """
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+def run_benchmark(size, latency=0.01, error_rate=0.0, threads=4,
+                  trace_memory=True, processes=0):
+    """
+    Loads a list of `size` tracks and resolves all of them, returns a dict of
+    measurements
+    """
+    extractor = FakeExtractor(latency=latency, error_rate=error_rate,
+                              list_size=size)
+    tmp = tempfile.mkdtemp(prefix='soundground-bench-')
+    playlist = FakeList()
+    cm = CloudManager(credman.Credentials(), playlist,
+                      MetadataCache(os.path.join(tmp, 'cache.db')),
+                      ydl_factory=extractor, processes=processes,
+                      throttled=False)
+    if not processes:
+        cm.pool.n_workers = threads
+
+    # Time every extraction and the arrival of the first rows
+    timings = []
+    first_row = []
+    process_url = cm.process_url
+    replace_items = playlist.replace_items
+
+    def timed_process_url(url, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return process_url(url, *args, **kwargs)
+        finally:
+            timings.append(time.perf_counter() - start)
+
+    def timed_replace_items(*args, **kwargs):
+        first_row.append(time.perf_counter())
+        return replace_items(*args, **kwargs)
+
+    cm.process_url = timed_process_url
+    playlist.replace_items = timed_replace_items
+
+    if trace_memory:
+        tracemalloc.start()
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        cm.load_list('benchmark/likes').wait()
+        cm.pool.join()
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+        peak = tracemalloc.get_traced_memory()[1] if trace_memory else None
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+        cm.pool.shutdown()
+        cm.list_pool.shutdown()
+        if cm.extractor != None:
+            cm.extractor.shutdown()
+        shutil.rmtree(tmp)
+
+    errors = sum(1 for item in playlist.items
+                 if item.info != None and 'error' in item.info)
+    return {
+        'size': size,
+        'latency': latency,
+        'error_rate': error_rate,
+        'threads': threads,
+        'processes': processes,
+        'wall_seconds': wall,
+        'throughput': size / wall if wall > 0 else 0.0,
+        'first_row_seconds': first_row[0] - wall_start if first_row else None,
+        'p50_ms': percentile(timings, 0.50) * 1000,
+        'p95_ms': percentile(timings, 0.95) * 1000,
+        'p99_ms': percentile(timings, 0.99) * 1000,
+        'max_ms': max(timings) * 1000 if timings else 0.0,
+        'cpu_seconds': cpu,
+        'cpu_utilization': cpu / wall if wall > 0 else 0.0,
+        'peak_bytes': peak,
+        'errors': errors,
+        'extractions': cm.stats.operations['process_url'].time.count,
+    }
+
+def print_result(result):
+    peak = result['peak_bytes']
+    print("{size:>7} tracks  {throughput:>9.1f} tracks/s  "
+          "p50 {p50_ms:>7.1f} ms  p99 {p99_ms:>7.1f} ms  "
+          "cpu {cpu_utilization:>5.0%}  errors {errors}".format(**result),
+          end='')
+    if peak != None:
+        print("  peak {:.1f} MiB".format(peak / 1024.0 / 1024.0), end='')
+    print()
+
+def main(argv):
+    arg_parser = argparse.ArgumentParser(
+        prog=argv[0],
+        description='Benchmark the SoundCloud fetch pipeline')
+    arg_parser.add_argument(
+        '--sizes', default='100,1000,10000',
+        help='comma separated list sizes, e.g. 100,1000,100000')
+    arg_parser.add_argument(
+        '--latency', type=float, default=0.01,
+        help='mean seconds per extraction')
+    arg_parser.add_argument(
+        '--error-rate', type=float, default=0.0,
+        help='fraction of extractions that fail')
+    arg_parser.add_argument(
+        '--threads', type=int, default=4,
+        help='number of fetch workers')
+    arg_parser.add_argument(
+        '--processes', type=int, default=0,
+        help='extract in this many worker processes instead of threads')
+    arg_parser.add_argument(
+        '--no-trace-memory', action='store_true',
+        help="don't trace peak memory, which slows allocations down")
+    arg_parser.add_argument(
+        '--label', default=metadata.version,
+        help='name to store the results under, the version by default')
+    arg_parser.add_argument(
+        '--output', default=os.path.join(RESULTS_DIRECTORY, 'fetch.json'),
+        help='JSON file results are stored in')
+    args = arg_parser.parse_args(argv[1:])
+
+    results = []
+    for size in [int(size) for size in args.sizes.split(',')]:
+        result = run_benchmark(size, args.latency, args.error_rate,
+                               args.threads, not args.no_trace_memory,
+                               args.processes)
+        print_result(result)
+        results.append(result)
+
+    previous = save_results(args.output, args.label, results)
+    print_changes(compare(
+        results, previous,
+        ('size', 'latency', 'error_rate', 'threads', 'processes'),
+        ('throughput', 'p99_ms', 'cpu_seconds', 'peak_bytes'), 'size'))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
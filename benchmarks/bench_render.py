@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Rendering benchmark
+Measures the redraw paths of winman on a headless curses stand-in
+"""
+
+import os
+import sys
+import time
+import argparse
+
+from soundground import metadata
+from soundground import winman as wm
+from benchmarks.fakes import FakeWindow, HeadlessScreen, FakePlayer
+from benchmarks.report import save_results, compare, print_changes
+
+RESULTS_DIRECTORY = os.path.join(os.path.dirname(__file__), 'results')
+
+# Playlist pane of an 80x24 terminal, see main.init_screen
+LIST_HEIGHT = 22
+LIST_WIDTH = 59
+
+def measure(name, operations, func, *windows):
+    """
+    Runs func and returns its time and what it drew to windows
+    """
+    for window in windows:
+        window.reset()
+    start = time.perf_counter()
+    func()
+    seconds = time.perf_counter() - start
+
+    result = {
+        'name': name,
+        'operations': operations,
+        'seconds': seconds,
+        'us_per_op': seconds / operations * 1e6 if operations else 0.0,
+    }
+    for key in ('writes', 'bytes', 'refreshes', 'scrolls', 'clears'):
+        result[key] = sum(getattr(window, key) for window in windows)
+    return result
+
+def make_list(window, rows=0):
+    selectable = wm.SelectableList(window)
+    selectable.active = True
+    if rows:
+        selectable.add_many('track {}'.format(index) for index in range(rows))
+    return selectable
+
+def bench_populate(rows, page_size=50):
+    """
+    Fills a list the way CloudManager streams a playlist in, page by page
+    """
+    window = FakeWindow(LIST_HEIGHT, LIST_WIDTH)
+    selectable = make_list(window)
+
+    def populate():
+        for start in range(0, rows, page_size):
+            end = min(rows, start + page_size)
+            selectable.add_many('track {}'.format(index)
+                                for index in range(start, end))
+
+    return measure('populate', rows, populate, window)
+
+def bench_add(rows):
+    """
+    Fills a list one row at a time
+    """
+    window = FakeWindow(LIST_HEIGHT, LIST_WIDTH)
+    selectable = make_list(window)
+
+    def add():
+        for index in range(rows):
+            selectable.add('track {}'.format(index))
+
+    return measure('add', rows, add, window)
+
+def bench_scroll(rows):
+    """
+    Moves the selection down through every row of a list, then back up
+    """
+    window = FakeWindow(LIST_HEIGHT, LIST_WIDTH)
+    selectable = make_list(window, rows)
+
+    def scroll():
+        for _ in range(rows - 1):
+            selectable.select(1)
+        for _ in range(rows - 1):
+            selectable.select(-1)
+
+    return measure('scroll', 2 * (rows - 1), scroll, window)
+
+def bench_row_updates(rows, updates):
+    """
+    Changes captions of visible and hidden rows, like fetch results arriving
+    """
+    window = FakeWindow(LIST_HEIGHT, LIST_WIDTH)
+    selectable = make_list(window, rows)
+
+    def update():
+        for step in range(updates):
+            index = step * 7919 % rows
+            selectable.items[index].caption = 'fetched {}'.format(step)
+            selectable.draw()
+
+    return measure('row_updates', updates, update, window)
+
+def bench_resize(rows, resizes):
+    """
+    Resizes the full window layout over and over, like a dragged terminal
+    """
+    with HeadlessScreen(24, 80) as screen:
+        wg = wm.WindowGroup(screen.stdscr)
+        wg.create_window('title', 0, 0, 1, wm.Value(100))
+        wg.create_window('nav', 1, 0, wm.Value(100, -2), wm.Value(25))
+        wg.create_window('command', wm.Value(100, -1), 0, 1, wm.Value(100))
+        wg.create_window('playlist', 1, wm.Value(25, 1), wm.Value(100, -2),
+                         wm.Value(75, -1))
+        wg.extra_draws.append(make_list(wg['nav'], 20))
+        wg.extra_draws.append(make_list(wg['playlist'], rows))
+        statusline = wm.StatusLine(wg['command'], FakePlayer())
+        statusline.refresh_state()
+        wg.extra_draws.append(statusline)
+        wg.resize()
+
+        sizes = [(24, 80), (50, 200), (30, 120), (60, 100)]
+
+        def resize():
+            for step in range(resizes):
+                screen.resize(*sizes[step % len(sizes)])
+                wg.resize()
+
+        result = measure('resize', resizes, resize, *screen.windows)
+        result['updates'] = screen.updates
+    return result
+
+def bench_status(updates):
+    """
+    Feeds position events to the status bar, several per displayed second
+    """
+    window = FakeWindow(1, 80)
+    player = FakePlayer()
+    statusline = wm.StatusLine(window, player)
+    statusline.refresh_state()
+
+    def update():
+        for step in range(updates):
+            # VLC reports positions about four times a second
+            statusline._on_position(step * 250.0 / player.length)
+
+    return measure('status', updates, update, window)
+
+def run_benchmarks(rows=100000, resizes=100, updates=10000):
+    """
+    Runs every rendering benchmark, returns a list of result dicts
+    """
+    return [
+        bench_populate(rows),
+        bench_add(rows),
+        bench_scroll(rows),
+        bench_row_updates(rows, updates),
+        bench_resize(rows, resizes),
+        bench_status(updates),
+    ]
+
+def print_result(result):
+    print("{name:>12} {operations:>8} ops  {us_per_op:>8.2f} us/op  "
+          "{writes:>8} writes  {bytes:>10} bytes  "
+          "{refreshes:>7} refreshes".format(**result))
+
+def main(argv):
+    arg_parser = argparse.ArgumentParser(
+        prog=argv[0],
+        description='Benchmark the curses redraw paths')
+    arg_parser.add_argument(
+        '--rows', type=int, default=100000,
+        help='number of rows in the list benchmarks')
+    arg_parser.add_argument(
+        '--resizes', type=int, default=100,
+        help='number of resizes in the resize storm')
+    arg_parser.add_argument(
+        '--updates', type=int, default=10000,
+        help='number of row and status bar updates')
+    arg_parser.add_argument(
+        '--label', default=metadata.version,
+        help='name to store the results under, the version by default')
+    arg_parser.add_argument(
+        '--output', default=os.path.join(RESULTS_DIRECTORY, 'render.json'),
+        help='JSON file results are stored in')
+    args = arg_parser.parse_args(argv[1:])
+
+    results = run_benchmarks(args.rows, args.resizes, args.updates)
+    for result in results:
+        print_result(result)
+
+    previous = save_results(args.output, args.label, results)
+    print_changes(compare(results, previous, ('name', 'operations'),
+                          ('us_per_op', 'writes', 'bytes'), 'name'))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,297 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Fakes
+Stand-ins for youtube_dl, curses and the playlist widget used by the
+benchmarks
+"""
+
+import time
+import curses
+import random
+import threading
+
+from soundground.items import ListItem
+
+class FakeExtractor(object):
+    """
+    Factory for FakeYoutubeDL instances, pass it as CloudManager's
+    ydl_factory
+
+    - latency:    mean seconds an extraction takes
+    - jitter:     fraction of latency added or removed at random
+    - error_rate: fraction of extractions that fail
+    - list_size:  number of entries returned for a list URL
+    """
+
+    def __init__(self, latency=0.01, jitter=0.5, error_rate=0.0, list_size=100,
+                 seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.list_size = list_size
+        self.seed = seed
+
+        self.instances = 0
+        self.extractions = 0
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # Worker processes get their own copy, without the lock
+        state = dict(self.__dict__)
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self.instances += 1
+            seed = self.seed + self.instances
+        return FakeYoutubeDL(self, random.Random(seed))
+
+class FakeYoutubeDL(object):
+    """
+    Mimics the parts of youtube_dl.YoutubeDL that CloudManager uses
+    """
+
+    def __init__(self, extractor, rng):
+        self.extractor = extractor
+        self.rng = rng
+
+    def _wait(self):
+        latency = self.extractor.latency
+        if latency > 0:
+            jitter = latency * self.extractor.jitter
+            time.sleep(max(0, latency + self.rng.uniform(-jitter, jitter)))
+
+    def extract_info(self, url, download=True, process=True):
+        if not process:
+            # Lists hand back a lazy generator of entries
+            return {'_type': 'playlist', 'entries': self._entries(url)}
+
+        self._wait()
+        with self.extractor._lock:
+            self.extractor.extractions += 1
+        if self.rng.random() < self.extractor.error_rate:
+            raise Exception('HTTP Error 503: Service Unavailable')
+
+        name = url.rstrip('/').split('/')[-1]
+        stream = 'https://cf-media.sndcdn.com/{}.128.mp3?expires={}'.format(
+            name, int(time.time()) + 3600)
+        # Roughly the shape and size of a real SoundCloud result
+        return {
+            'id': name,
+            'uploader': 'uploader',
+            'title': name,
+            'duration': 200.0,
+            'webpage_url': url,
+            'url': stream,
+            'ext': 'mp3',
+            'protocol': 'https',
+            'formats': [{'url': stream, 'format_id': 'http_mp3_128_url',
+                         'ext': 'mp3', 'abr': 128, 'protocol': 'https',
+                         'http_headers': {'User-Agent': 'Mozilla/5.0'}}] * 4,
+            'thumbnails': [{'url': 'https://i1.sndcdn.com/{}-{}.jpg'.format(name, i)}
+                           for i in range(12)],
+            'description': 'x' * 500,
+        }
+
+    def _entries(self, url):
+        for index in range(self.extractor.list_size):
+            yield {'_type': 'url', 'url': '{}/track{}'.format(url, index)}
+
+class FakeList(object):
+    """
+    Headless stand-in for SelectableList
+    """
+
+    def __init__(self):
+        self.items = []
+        self.scrollpos = 0
+        self.selected = 0
+        self.draws = 0
+
+    def draw(self):
+        self.draws += 1
+
+    def add(self, caption, selectable=True, value=None):
+        self.items.append(ListItem(caption, selectable, value))
+
+    def add_many(self, captions, selectable=True, values=None):
+        self.items.extend(ListItem(caption, selectable) for caption in captions)
+
+    def replace_items(self, captions, selectable=True, values=None):
+        self.items = []
+        self.add_many(captions, selectable, values)
+
+class FakeWindow(object):
+    """
+    Headless curses window that keeps its text and counts what is drawn
+
+    - writes:    number of addstr calls
+    - bytes:     UTF-8 bytes passed to addstr
+    - refreshes: number of refresh and noutrefresh calls
+    - scrolls:   number of scroll calls
+    - clears:    number of erase and clear calls
+    """
+
+    def __init__(self, height, width, y=0, x=0):
+        self.height = height
+        self.width = width
+        self.y = y
+        self.x = x
+        self.lines = [''] * height
+        self.reset()
+
+    def reset(self):
+        """
+        Zeroes the counters
+        """
+        self.writes = 0
+        self.bytes = 0
+        self.refreshes = 0
+        self.scrolls = 0
+        self.clears = 0
+
+    def getmaxyx(self):
+        return self.height, self.width
+
+    def getbegyx(self):
+        return self.y, self.x
+
+    def addstr(self, y, x, text, attr=0):
+        self.writes += 1
+        self.bytes += len(text.encode('utf-8'))
+        line = self.lines[y].ljust(x)
+        line = line[:x] + text + line[x + len(text):]
+        self.lines[y] = line[:self.width].rstrip()
+
+    def erase(self):
+        self.clears += 1
+        self.lines = [''] * self.height
+
+    clear = erase
+
+    def scrollok(self, flag):
+        pass
+
+    def scroll(self, lines):
+        self.scrolls += 1
+        if lines > 0:
+            self.lines = self.lines[lines:] + [''] * lines
+        else:
+            self.lines = [''] * -lines + self.lines[:lines]
+
+    def refresh(self):
+        self.refreshes += 1
+
+    noutrefresh = refresh
+
+    def resize(self, height, width):
+        self.lines = (self.lines + [''] * height)[:height]
+        self.lines = [line[:width] for line in self.lines]
+        self.height = height
+        self.width = width
+
+    def mvwin(self, y, x):
+        self.y = y
+        self.x = x
+
+    def overwrite(self, target):
+        pass
+
+    def bkgd(self, char, attr=0):
+        pass
+
+    def move(self, y, x):
+        pass
+
+class HeadlessScreen(object):
+    """
+    Replaces the curses screen functions with FakeWindow instances while
+    used as a context manager, so WindowGroup runs without a terminal
+    """
+
+    def __init__(self, height=24, width=80):
+        self.stdscr = FakeWindow(height, width)
+        self.windows = [self.stdscr]
+        self.updates = 0
+        self._saved = None
+
+    def newwin(self, height, width, y=0, x=0):
+        window = FakeWindow(height, width, y, x)
+        self.windows.append(window)
+        return window
+
+    def doupdate(self):
+        self.updates += 1
+
+    def endwin(self):
+        pass
+
+    def resize(self, height, width):
+        """
+        Changes the terminal size, like a SIGWINCH would
+        """
+        self.stdscr.resize(height, width)
+        curses.LINES, curses.COLS = height, width
+
+    def counters(self):
+        """
+        Returns the counters summed over all windows
+        """
+        totals = {'updates': self.updates}
+        for key in ('writes', 'bytes', 'refreshes', 'scrolls', 'clears'):
+            totals[key] = sum(getattr(window, key) for window in self.windows)
+        return totals
+
+    def reset(self):
+        self.updates = 0
+        for window in self.windows:
+            window.reset()
+
+    def __enter__(self):
+        names = ('newwin', 'doupdate', 'endwin', 'LINES', 'COLS')
+        self._saved = {name: getattr(curses, name) for name in names
+                       if hasattr(curses, name)}
+        curses.newwin = self.newwin
+        curses.doupdate = self.doupdate
+        curses.endwin = self.endwin
+        curses.LINES, curses.COLS = self.stdscr.getmaxyx()
+        return self
+
+    def __exit__(self, *exc_info):
+        for name in ('LINES', 'COLS'):
+            if name not in self._saved:
+                delattr(curses, name)
+        for name, value in self._saved.items():
+            setattr(curses, name, value)
+        return False
+
+class FakePlayer(object):
+    """
+    Player stand-in with a fixed track, for StatusLine
+    """
+
+    def __init__(self, title='title', length=200000):
+        self.title = title
+        self.length = length
+        self.volume = 100
+
+    def is_playing(self):
+        return True
+
+    def get_title(self):
+        return self.title
+
+    def get_length(self):
+        return self.length
+
+    def get_position(self):
+        return 0.0
+
+    def audio_get_volume(self):
+        return self.volume
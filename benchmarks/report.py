@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Report
+Stores benchmark results per version and compares them
+"""
+
+import os
+import json
+import time
+
+def save_results(path, label, results):
+    """
+    Stores results under a label (usually the version) and returns the
+    results previously stored under the most recent other label
+    """
+    history = {}
+    if os.path.exists(path):
+        with open(path, 'r') as results_file:
+            history = json.load(results_file)
+
+    previous = None
+    others = [entry for name, entry in history.items() if name != label]
+    if others:
+        previous = max(others, key=lambda entry: entry['timestamp'])
+
+    history[label] = {'timestamp': time.time(), 'results': results}
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    with open(path, 'w') as results_file:
+        json.dump(history, results_file, indent=2, sort_keys=True)
+
+    return previous['results'] if previous else None
+
+def compare(results, previous, params, keys, name):
+    """
+    Returns lines describing relative changes of `keys` against previous
+    results with the same `params`, each labelled with the `name` field
+    """
+    lines = []
+    for result in results:
+        match = [old for old in previous or []
+                 if all(old.get(param) == result[param] for param in params)]
+        if not match:
+            continue
+        for key in keys:
+            old, new = match[0].get(key), result.get(key)
+            if old and new != None:
+                lines.append("  {:>14}: {:<12} {:>+7.1f}%".format(
+                    str(result[name]), key, (new - old) / old * 100))
+    return lines
+
+def print_changes(lines):
+    if lines:
+        print("Compared to the previous version:")
+        print("\n".join(lines))
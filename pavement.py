@@ -133,6 +133,19 @@ def run(args):
     raise SystemExit(main([CODE_DIRECTORY] + args))
 
 
+@task
+@consume_args
+def bench(args):
+    """Run a benchmark, `fetch' (default) or `render'. Other arguments are
+    passed to it."""
+    import importlib
+    name = 'fetch'
+    if args and not args[0].startswith('-'):
+        name = args.pop(0)
+    module = importlib.import_module('benchmarks.bench_' + name)
+    raise SystemExit(module.main(['bench_' + name] + args))
+
+
 @task
 def commit():
     """Commit only if all the tests pass."""
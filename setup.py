@@ -250,7 +250,7 @@ setup_dict = dict(
         'Topic :: System :: Installation/Setup',
         'Topic :: System :: Software Distribution',
     ],
-    packages=find_packages(exclude=(TESTS_DIRECTORY,)),
+    packages=find_packages(exclude=(TESTS_DIRECTORY, 'benchmarks')),
     install_requires=[
         # your module dependencies
     ] + python_version_specific_requires,
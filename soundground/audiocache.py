@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Audio Cache
+Keeps downloaded tracks on disk so repeated plays don't stream them again
+"""
+
+import os
+import shutil
+import hashlib
+import threading
+import urllib.request
+
+class AudioCache(object):
+    """
+    A directory of audio files bounded by `max_bytes`, keyed by canonical
+    track URL
+
+    File modification times double as LRU timestamps, so several processes
+    can share the directory without any extra index.
+    """
+
+    def __init__(self, path=None, max_bytes=1024 ** 3):
+        if path == None:
+            path = os.path.join(os.path.expanduser("~/.soundground/"), "audio")
+
+        self.path = path
+        self.max_bytes = max_bytes
+
+        # Statistics
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self.bytes_downloaded = 0
+        self._lock = threading.Lock()
+
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+
+    def _file(self, key):
+        """
+        Returns the path a key is stored at
+        """
+        name = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.path, name + '.audio')
+
+    def contains(self, key):
+        return os.path.exists(self._file(key))
+
+    def get(self, key):
+        """
+        Returns the local path of a cached track, or None
+        """
+        path = self._file(key)
+        try:
+            # Bump modification time for LRU eviction
+            os.utime(path, None)
+            size = os.path.getsize(path)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+            self.bytes_saved += size
+        return path
+
+    def download(self, key, url):
+        """
+        Downloads a track into the cache, returns its local path
+        """
+        path = self._file(key)
+        if os.path.exists(path):
+            return path
+
+        # Write to a private temporary name, then move it in place atomically
+        partial = '{}.{}-{}.part'.format(path, os.getpid(), threading.get_ident())
+        try:
+            with urllib.request.urlopen(url, timeout=30) as response, \
+                    open(partial, 'wb') as target:
+                shutil.copyfileobj(response, target, 64 * 1024)
+            size = os.path.getsize(partial)
+            os.replace(partial, path)
+        finally:
+            if os.path.exists(partial):
+                os.remove(partial)
+
+        with self._lock:
+            self.bytes_downloaded += size
+        self.evict()
+        return path
+
+    def evict(self):
+        """
+        Removes least recently used tracks until the cache fits its budget
+        """
+        entries = []
+        total = 0
+        for name in os.listdir(self.path):
+            if not name.endswith('.audio'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.path, name))
+            except OSError:
+                # Removed by another process
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+            total += stat.st_size
+
+        entries.sort()
+        for mtime, size, name in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.path, name))
+            except OSError:
+                pass
+            total -= size
+        return total
+
+    def stats(self):
+        """
+        Returns hit/miss counters and byte totals
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'bytes_saved': self.bytes_saved,
+                'bytes_downloaded': self.bytes_downloaded,
+            }
@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Metadata Cache
+Persistent, size-bounded store for track info fetched from SoundCloud
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+
+class MetadataCache(object):
+    """
+    Caches track info on disk, keyed by canonical track URL.
+
+    Entries expire after `ttl` seconds and the least recently used entries
+    are evicted once more than `max_entries` are stored. The backing store is
+    an SQLite database in WAL mode, so several soundground processes can
+    share the same cache file.
+    """
+
+    # Number of insertions between eviction passes
+    evict_interval = 100
+
+    def __init__(self, path=None, ttl=7 * 24 * 3600, max_entries=50000):
+        if path == None:
+            path = os.path.join(os.path.expanduser("~/.soundground/"), "cache.db")
+
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        # Statistics
+        self.hits = 0
+        self.misses = 0
+        self.fetch_time = 0.0
+        self.fetches = 0
+        self._puts = 0
+
+        base_dir = os.path.dirname(self.path)
+        if base_dir and not os.path.exists(base_dir):
+            os.makedirs(base_dir)
+
+        # Connections can't be shared between threads, keep one per thread
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._init_db()
+
+    def _connect(self):
+        """
+        Returns the SQLite connection for the calling thread
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn == None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _init_db(self):
+        """
+        Creates the cache table if it doesn't exist yet
+        """
+        conn = self._connect()
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS tracks ('
+            ' key TEXT PRIMARY KEY,'
+            ' value TEXT NOT NULL,'
+            ' created REAL NOT NULL,'
+            ' accessed REAL NOT NULL)')
+        conn.execute(
+            'CREATE INDEX IF NOT EXISTS tracks_accessed ON tracks (accessed)')
+
+    def get(self, key):
+        """
+        Returns the cached info for a key, or None if missing or expired
+        """
+        now = time.time()
+        conn = self._connect()
+        row = conn.execute(
+            'SELECT value, created FROM tracks WHERE key = ?', (key,)).fetchone()
+
+        if row == None or now - row[1] > self.ttl:
+            if row != None:
+                conn.execute('DELETE FROM tracks WHERE key = ?', (key,))
+            with self._lock:
+                self.misses += 1
+            return None
+
+        # Bump access time for LRU eviction
+        conn.execute('UPDATE tracks SET accessed = ? WHERE key = ?', (now, key))
+        with self._lock:
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key, value):
+        """
+        Stores info for a key, evicting old entries if the cache is full
+        """
+        now = time.time()
+        data = json.dumps(value, default=str)
+        conn = self._connect()
+        conn.execute(
+            'INSERT OR REPLACE INTO tracks (key, value, created, accessed) '
+            'VALUES (?, ?, ?, ?)', (key, data, now, now))
+
+        with self._lock:
+            self._puts += 1
+            evict = self._puts % self.evict_interval == 0
+        if evict:
+            self._evict(conn)
+
+    def record_fetch(self, seconds):
+        """
+        Records how long an uncached fetch took, used to estimate time saved
+        """
+        with self._lock:
+            self.fetch_time += seconds
+            self.fetches += 1
+
+    def remove(self, key):
+        """
+        Removes a single entry
+        """
+        self._connect().execute('DELETE FROM tracks WHERE key = ?', (key,))
+
+    def clear(self):
+        """
+        Removes all entries
+        """
+        self._connect().execute('DELETE FROM tracks')
+
+    def _evict(self, conn):
+        """
+        Drops expired entries and trims the cache down to max_entries
+        """
+        conn.execute('DELETE FROM tracks WHERE created < ?',
+                     (time.time() - self.ttl,))
+        count = conn.execute('SELECT COUNT(*) FROM tracks').fetchone()[0]
+        if count > self.max_entries:
+            conn.execute(
+                'DELETE FROM tracks WHERE key IN ('
+                ' SELECT key FROM tracks ORDER BY accessed ASC LIMIT ?)',
+                (count - self.max_entries,))
+
+    def __len__(self):
+        return self._connect().execute('SELECT COUNT(*) FROM tracks').fetchone()[0]
+
+    def stats(self):
+        """
+        Returns hit/miss counters
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            avg_fetch = self.fetch_time / self.fetches if self.fetches else 0.0
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'avg_fetch_time': avg_fetch,
+                'saved_seconds': self.hits * avg_fetch,
+            }
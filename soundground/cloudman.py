@@ -5,108 +5,748 @@ Cloud Manager
 Handles communication to SoundCloud
 """
 
+import json
+import time
+import weakref
+import functools
 import threading
-import youtube_dl
+import multiprocessing
+import concurrent.futures
+
+from soundground import connpool, credman, log, stats, throttle, utils
+from soundground.cache import MetadataCache
+from soundground.stats import FetchStats
+from soundground.utils import expires_soon
+from soundground.workers import WorkerPool, SingleFlight
+from soundground.winman import UpdateQueue
+
+logger = log.get_logger(__name__)
+
+# Fields of an extract_info result that are kept in memory and in the cache
+INFO_FIELDS = ('id', 'uploader', 'title', 'duration', 'webpage_url', 'url',
+               'ext', 'protocol')
+
+def iter_entries(entries):
+    """
+    Iterates over playlist entries, whether youtube_dl returned a list, a
+    generator or a paged list
+    """
+    if hasattr(entries, 'getslice'):
+        # PagedList, fetch it page by page
+        start = 0
+        while True:
+            page = entries.getslice(start, start + CloudManager.page_size)
+            if not page:
+                return
+            for entry in page:
+                yield entry
+            start += len(page)
+    else:
+        for entry in entries:
+            yield entry
+
+class SharedEntries(object):
+    """
+    Lazily read list entries that any number of readers can iterate over,
+    each from the start. Entries are read from the source once, as the
+    furthest reader needs them.
+    """
+
+    def __init__(self, entries, info=None):
+        self.source = iter_entries(entries)
+        # The rest of the extract_info result
+        self.info = info or {}
+        self.entries = []
+        self.done = False
+        self.error = None
+        self._lock = threading.Lock()
+
+    def __iter__(self):
+        index = 0
+        while True:
+            with self._lock:
+                if index == len(self.entries) and not self.done:
+                    try:
+                        self.entries.append(next(self.source))
+                    except StopIteration:
+                        self.done = True
+                    except Exception as ex:
+                        self.error = ex
+                        self.done = True
+                if index < len(self.entries):
+                    entry = self.entries[index]
+                elif self.error != None:
+                    raise self.error
+                else:
+                    return
+            index += 1
+            yield entry
+
+def project_info(info, fields=INFO_FIELDS):
+    """
+    Returns a copy of an extract_info result with only the given fields
+    """
+    return {field: info[field] for field in fields if field in info}
+
+def create_ydl(username='', password='', socket_timeout=None):
+    """
+    Creates a YoutubeDL instance logged in with the given credentials, whose
+    requests give up after stalling for socket_timeout seconds
+    """
+    # youtube_dl pulls in hundreds of extractors, load it on first use
+    import youtube_dl
+
+    options = {
+        'username': username,
+        'password': password,
+        'quiet': True,
+    }
+    if socket_timeout != None:
+        options['socket_timeout'] = socket_timeout
+    ydl = youtube_dl.YoutubeDL(options)
+    # Reuse connections and DNS lookups across all instances
+    connpool.shared_pool().install(ydl._opener)
+    return ydl
+
+def extract(ydl, url, fields=INFO_FIELDS, keep_raw=False):
+    """
+    Extracts info on a URL, returns the projected info, the size of the full
+    result serialized and, if keep_raw is set, the full result
+    """
+    info = ydl.extract_info(url, download=False)
+    size = len(json.dumps(info, default=str))
+    return project_info(info, fields), size, info if keep_raw else None
+
+class ExtractionError(Exception):
+    """
+    An extraction that failed in a worker process, error_type names the
+    original exception
+    """
+
+    def __init__(self, message, error_type):
+        super(ExtractionError, self).__init__(message)
+        self.error_type = error_type
+
+# YoutubeDL factory and instance of a worker process, see ProcessExtractor
+_worker_factory = None
+_worker_ydl = None
+
+def _init_worker(factory):
+    global _worker_factory
+    _worker_factory = factory
+
+def _extract_in_worker(url, fields, keep_raw):
+    """
+    Runs extract in a worker process and returns a picklable record
+    """
+    global _worker_ydl
+    if _worker_ydl == None:
+        _worker_ydl = _worker_factory()
+    try:
+        info, size, raw = extract(_worker_ydl, url, fields, keep_raw)
+    except Exception as ex:
+        # youtube_dl errors carry tracebacks, which don't pickle
+        return {'error': str(ex), 'error_type': stats.error_type(ex)}
+    return {'info': info, 'size': size, 'raw': raw}
+
+class ProcessExtractor(object):
+    """
+    Runs extractions in a pool of worker processes, each with its own
+    YoutubeDL instance, so parsing isn't serialised on the GIL
+
+    The factory has to be picklable, e.g. a module-level function or a
+    functools.partial of one. Extractions taking longer than `timeout`
+    seconds fail with a TimeoutError, so they don't hold up their caller.
+    """
+
+    def __init__(self, factory, processes, timeout=None):
+        self.factory = factory
+        self.processes = processes
+        self.timeout = timeout
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def executor(self):
+        """
+        Returns the process pool, starting it on first use
+        """
+        with self._lock:
+            if self._executor == None:
+                # Forking a process that runs threads isn't safe
+                self._executor = concurrent.futures.ProcessPoolExecutor(
+                    self.processes, multiprocessing.get_context('spawn'),
+                    _init_worker, (self.factory,))
+            return self._executor
+
+    def extract(self, url, fields=INFO_FIELDS, keep_raw=False):
+        """
+        Same as extract, but in a worker process
+        """
+        future = self.executor().submit(_extract_in_worker, url, fields,
+                                        keep_raw)
+        try:
+            record = future.result(self.timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise ExtractionError(
+                "Extraction timed out after {}s".format(self.timeout),
+                'TimeoutError')
+        if 'error' in record:
+            raise ExtractionError(record['error'], record['error_type'])
+        return record['info'], record['size'], record['raw']
+
+    def shutdown(self, wait=True):
+        """
+        Stops the worker processes, new ones are started on the next
+        extraction
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor != None:
+            executor.shutdown(wait)
+
+class YoutubeDLPool(object):
+    """
+    Hands out one YoutubeDL instance per thread, created lazily and reused
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.instances = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def get(self):
+        """
+        Returns the calling thread's YoutubeDL instance
+        """
+        ydl = getattr(self._local, 'ydl', None)
+        if ydl == None:
+            ydl = self.factory()
+            self._local.ydl = ydl
+            with self._lock:
+                self.instances.append(ydl)
+        return ydl
+
+    def reset(self):
+        """
+        Discards all instances, e.g. after the credentials changed
+        """
+        with self._lock:
+            self.instances = []
+            self._local = threading.local()
 
 class CloudManager(object):
     base = 'https://soundcloud.com/'
 
-    def __init__(self, cred=None, playlist=None):
+    # Fields kept from extract_info results, see project_info
+    info_fields = INFO_FIELDS
+    # Also spill the full extract_info result to the disk cache
+    keep_raw = False
+    # Number of list entries added to the playlist at once
+    page_size = 50
+    # Assumed lifetime of stream URLs that don't say when they expire
+    stream_ttl = 600
+    # Stream URLs are re-resolved this many seconds before they expire
+    expiry_margin = 30
+    # Requests fail after stalling for socket_timeout seconds, extractions
+    # in worker processes after taking extract_timeout seconds in total
+    socket_timeout = 15
+    extract_timeout = 60
+
+    # Extractions per second across all workers, and the burst allowed
+    rate_limit = 8
+    rate_burst = 16
+    # Transient errors are retried after a jittered exponential backoff
+    max_retries = 3
+    retry_base = 1.0
+    retry_cap = 30.0
+    # Requests pause for breaker_cooldown seconds after breaker_threshold
+    # transient failures in a row
+    breaker_threshold = 5
+    breaker_cooldown = 30
+    # Seconds a definitively unavailable URL isn't requested again
+    negative_ttl = 600
+
+    # Fetch priority tiers, see reprioritize
+    PRIORITY_VISIBLE = 0
+    PRIORITY_NEARBY = 1
+    PRIORITY_REST = 2
+
+    def __init__(self, cred=None, playlist=None, cache=None, ydl_factory=None,
+                 updates=None, processes=0, throttled=True):
         # Use empty credentials if not given
         if cred == None:
             cred = credman.Credentials()
 
         self.cred = cred
         self.playlist = playlist
-        options = {
-            'username': self.cred.username,
-            'password': self.cred.password,
-            'quiet': True,
-        }
-        self.ydl = youtube_dl.YoutubeDL(options)
+        # Playlist changes are handed to the UI thread through this queue
+        if updates == None:
+            updates = UpdateQueue()
+        self.updates = updates
+        # Persistent track info cache, shared between soundground processes
+        if cache == None:
+            cache = MetadataCache()
+        self.cache = cache
+        # Each worker thread gets its own YoutubeDL instance
+        self.ydl_factory = ydl_factory
+        if ydl_factory == None:
+            ydl_factory = self._create_ydl
+        self.ydl_pool = YoutubeDLPool(ydl_factory)
+        # Extraction times, sizes, errors and queue waits
+        self.stats = FetchStats()
         # Number of threads to use for downloading media info
         self.n_threads = 4
-        self.dl_threads = [None]*self.n_threads
+        # With processes, track info is extracted in that many worker
+        # processes instead of the fetch threads, which then only schedule
+        self.processes = processes
+        self.extractor = None
+        if processes > 0:
+            self.n_threads = processes
+            self.extractor = ProcessExtractor(self._process_factory(),
+                                              processes, self.extract_timeout)
+        self.pool = WorkerPool(self.n_threads, 'fetch', self.stats)
+        # Lists are read on their own thread, so they don't hold up fetches
+        self.list_pool = WorkerPool(1, 'list', self.stats)
+
+        # Shared by every request to SoundCloud, see _request. Fake
+        # extractors of tests and benchmarks don't need to be spared.
+        if not throttled:
+            self.rate_limit = 0
+            self.max_retries = 0
+            self.breaker_threshold = 0
+        self.limiter = throttle.TokenBucket(self.rate_limit, self.rate_burst)
+        self.breaker = throttle.CircuitBreaker(self.breaker_threshold,
+                                               self.breaker_cooldown)
+        self.unavailable = throttle.NegativeCache(self.negative_ttl)
+        # Identical requests running at the same time are made only once,
+        # and lists still being read are shared by canonical URL
+        self.flights = SingleFlight(self.stats)
+        self.lists = weakref.WeakValueDictionary()
+
+        # Bumped whenever the playlist gets other contents, work done for an
+        # older generation is dropped
+        self.generation = 0
+        # Rows, as (index, url), already picked up by a worker, and the best
+        # priority tier each row was queued with
+        self.claimed = set()
+        self.queued = {}
+        self._lock = threading.Lock()
+
+        # Fetch what's on screen first
+        if playlist != None and hasattr(playlist, 'on_scroll'):
+            playlist.on_scroll.append(self.reprioritize)
+
+    def _create_ydl(self):
+        """
+        Creates a YoutubeDL instance configured with the current credentials
+        """
+        return create_ydl(self.cred.username, self.cred.password,
+                          self.socket_timeout)
+
+    def _process_factory(self):
+        """
+        Returns a picklable YoutubeDL factory for worker processes
+        """
+        if self.ydl_factory != None:
+            return self.ydl_factory
+        return functools.partial(create_ydl, self.cred.username,
+                                 self.cred.password, self.socket_timeout)
+
+    def reset_extractors(self):
+        """
+        Discards YoutubeDL instances and worker processes, e.g. after the
+        credentials changed
+        """
+        self.ydl_pool.reset()
+        if self.extractor != None:
+            self.extractor.shutdown(False)
+            self.extractor.factory = self._process_factory()
 
     def async_process_playlist(self):
         """
-        Process the playlist in background
+        Process the playlist in background, returns the queued jobs
         """
-        thread = threading.Thread(target=self.process_playlist)
-        thread.run()
-        return thread
+        generation = self.cancel()
+        return [self._queue_item(generation, index, item.value,
+                                 self.PRIORITY_REST, index)
+                for index, item in enumerate(self.playlist.items)]
 
     def process_playlist(self):
         """
-        Get URL info and edit the playlist
+        Get URL info and edit the playlist, blocking until done
         """
-        def process_item(self, index):
-            """
-            Processes a single playlist item
-            """
-            # Display status
-            self.playlist.items[index]['caption'] += ' [fetching info]'
-            self.playlist.draw()
+        jobs = self.async_process_playlist()
+        self.pool.join()
+        return jobs
 
-            # Fetch info
-            list_items = self.playlist.items
-            try:
-                info = self.process_url(list_items[index]['value'])
-            except Exception as ex:
-                info = {'error': str(ex)}
+    def load_list(self, url):
+        """
+        Streams a SoundCloud list into the playlist in the background,
+        cancelling the list loaded before
+        """
+        return self.list_pool.submit(self._load_list, url, self.cancel())
 
-            list_items[index]['info'] = info
+    def _load_list(self, url, generation):
+        """
+        Adds list entries to the playlist page by page as they arrive, and
+        queues each page for processing. Stops as soon as another list is
+        loaded.
+        """
+        if generation != self.generation:
+            return
+        result = self.fetch_url(url)
+        if 'error' in result:
+            self._post_list(generation, self.playlist.replace_items,
+                            [result['error']])
+            return
 
-            # Set item title
-            if 'error' in info:
-                title = info['error']
-            elif 'uploader' in info:
-                title = "{} - {}".format(info['uploader'], info['title'])
-            else:
-                username = info['webpage_url'].split('/')[3]
-                title = "{} - {}".format(username, info['title'])
+        page = []
+        count = 0
+        error = None
+        try:
+            for entry in iter_entries(result.get('entries') or []):
+                if generation != self.generation:
+                    logger.debug('stopped reading %s after %d entries', url,
+                                 count + len(page))
+                    return
+                page.append(entry['url'])
+                if len(page) >= self.page_size:
+                    self._add_page(generation, page, count)
+                    count += len(page)
+                    page = []
+        except Exception as ex:
+            # Keep what was read so far
+            error = str(ex)
+        self._add_page(generation, page, count)
 
-            list_items[index]['caption'] = title
+        if error != None:
+            self._post_list(generation, self.playlist.add, error, False)
 
-            # Re-draw playlist
-            self.playlist.draw()
+    def _add_page(self, generation, urls, start):
+        """
+        Hands a page of list entries to the UI thread and queues their info
+        """
+        if start == 0:
+            # First page replaces the loading screen
+            self._post_list(generation, self.playlist.replace_items, urls)
+        elif urls:
+            self._post_list(generation, self.playlist.add_many, urls)
 
-        # Iterate through items
-        index = 0
-        while index < len(self.playlist.items)-1:
-            # Find a free thread
-            for i in range(self.n_threads):
-                if self.dl_threads[i] == None or not self.dl_threads[i].isAlive():
-                    # Create thread and run
-                    self.dl_threads[i] = threading.Thread(target=process_item, args=(self, index))
-                    self.dl_threads[i].start()
-                    index += 1
-                    if index == len(self.playlist.items):
-                        break
-
-    def process_url(self, url):
-        """
-        Gets info on a URL
-        """
-        with self.ydl as ydl:
-            try:
-                # Add base domain if the URL doesn't have it
-                if url[:8] != 'https://':
-                    url = self.base + url
+        for offset, url in enumerate(urls):
+            index = start + offset
+            self._queue_item(generation, index, url, self.PRIORITY_REST, index)
 
-                return ydl.extract_info(url, download=False)
+    def _post_list(self, generation, method, *args):
+        """
+        Queues a playlist change for the UI thread, dropped if another list
+        was loaded in the meantime
+        """
+        def update():
+            if generation == self.generation:
+                method(*args)
+        self.updates.post(update, target=self.playlist)
+
+    def cancel(self):
+        """
+        Stops all work on the current playlist contents: the list being read,
+        queued fetches and pending row updates. Call it before the playlist
+        is given other contents. Returns the new generation.
+        """
+        with self._lock:
+            self.generation += 1
+            self.claimed = set()
+            self.queued = {}
+            generation = self.generation
+        cancelled = self.pool.cancel(lambda job: job.func == self.process_item)
+        if cancelled:
+            logger.debug('cancelled %d queued fetches', cancelled)
+        return generation
+
+    def _queue_item(self, generation, index, url, tier, order):
+        """
+        Queues an item for processing unless it's already queued with the same
+        or a better tier. Items are ordered by tier, then by order.
+        """
+        row = (index, url)
+        with self._lock:
+            if generation != self.generation:
+                return None
+            if row in self.claimed or self.queued.get(row, tier + 1) <= tier:
+                return None
+            self.queued[row] = tier
+        return self.pool.submit(self.process_item, generation, index, url,
+                                priority=(tier, order))
+
+    def reprioritize(self, playlist=None):
+        """
+        Moves fetches for visible rows, then for rows around them, ahead of the
+        rest of the list. Called when the playlist scrolls.
+        """
+        if playlist == None:
+            playlist = self.playlist
+        items = playlist.items
+        height, width = playlist.window.getmaxyx()
+        first = playlist.scrollpos
+        last = min(first + height, len(items))
+
+        generation = self.generation
+
+        # Visible rows, closest to the selection first. Unselectable rows,
+        # e.g. messages, aren't tracks.
+        for index in range(first, last):
+            if items[index].selectable:
+                self._queue_item(generation, index, items[index].value,
+                                 self.PRIORITY_VISIBLE,
+                                 abs(index - playlist.selected))
+
+        # A screen's worth of rows above and below
+        for distance in range(1, height + 1):
+            for index in (first - distance, last - 1 + distance):
+                if 0 <= index < len(items) and items[index].selectable:
+                    self._queue_item(generation, index, items[index].value,
+                                     self.PRIORITY_NEARBY, distance)
+
+    def process_item(self, generation, index, url):
+        """
+        Processes a single playlist item
+        """
+        # Skip duplicates left in the queue by reprioritize, and rows of a
+        # list that was replaced
+        with self._lock:
+            if generation != self.generation or (index, url) in self.claimed:
+                return
+            self.claimed.add((index, url))
+        logger.debug('fetching #%d %s', index, url)
+        # Display status
+        self._post_item(generation, index, url, url + ' [fetching info]')
+
+        # Fetch info
+        try:
+            info = self.process_url(url)
+        except Exception as ex:
+            info = {'error': str(ex)}
+
+        # Set item title
+        if 'error' in info:
+            title = info['error']
+        elif 'uploader' in info:
+            title = "{} - {}".format(info['uploader'], info['title'])
+        else:
+            username = info['webpage_url'].split('/')[3]
+            title = "{} - {}".format(username, info['title'])
+
+        self._post_item(generation, index, url, title, info)
+
+    def _post_item(self, generation, index, url, caption, info=None):
+        """
+        Queues a playlist item change for the UI thread
+        """
+        if generation != self.generation:
+            return
+        self.updates.post(self._update_item, generation, index, url, caption,
+                          info, target=self.playlist)
+
+    def _update_item(self, generation, index, url, caption, info):
+        """
+        Applies a playlist item change, runs on the UI thread. Changes to rows
+        of a replaced list, or to rows that since went away or hold another
+        track, are dropped.
+        """
+        items = self.playlist.items
+        if (generation != self.generation or index >= len(items) or
+                items[index].value != url):
+            logger.debug('dropped stale update of #%d %s', index, url)
+            return
+        item = items[index]
+        item.caption = caption
+        if info != None:
+            item.info = info
+
+    def process_url(self, url, fresh=False, wait=True):
+        """
+        Gets info on a URL, consulting the metadata cache first unless fresh
+        is set. Without wait, a failed request isn't retried, see _request.
+        """
+        key = utils.canonical_url(url, self.base)
+        if not fresh:
+            info = self.cache.get(key)
+            if info != None:
+                return info
+            # Don't ask again for tracks that were just found missing
+            error = self.unavailable.get(key)
+            if error != None:
+                return {'error': error}
+
+        # Callers that can't wait for retries don't join those that can
+        return self.flights.do('process_url', (key, wait), self._process_url,
+                               key, url, wait)
+
+    def _process_url(self, key, url, wait):
+        """
+        Extracts info on a URL and caches it, see process_url
+        """
+        # Add base domain if the URL doesn't have it
+        if url[:8] != 'https://':
+            url = self.base + url
+
+        try:
+            (info, size, raw), elapsed = self._request(
+                'process_url', wait, self._extract, url)
+        except Exception as ex:
+            if throttle.classify(ex) == throttle.PERMANENT:
+                self.unavailable.put(key, str(ex))
+            return {'error': str(ex)}
+        self.stats.record('process_url', elapsed, size)
+        self.unavailable.remove(key)
+
+        # Only successful lookups are cached
+        self.cache.record_fetch(elapsed)
+        if raw != None:
+            self.cache.put('raw:' + key, raw)
+
+        # Signed stream URLs expire, remember when
+        if 'url' in info:
+            expires = utils.url_expiry(info['url'])
+            if expires == None:
+                expires = time.time() + self.stream_ttl
+            info['expires'] = expires
+
+        self.cache.put(key, info)
+        return info
+
+    def _extract(self, url):
+        """
+        Extracts a URL in a worker process or with this thread's YoutubeDL
+        """
+        if self.extractor != None:
+            return self.extractor.extract(url, self.info_fields, self.keep_raw)
+        return extract(self.ydl_pool.get(), url, self.info_fields,
+                       self.keep_raw)
+
+    def _request(self, operation, wait, func, *args, **kwargs):
+        """
+        Runs a request to SoundCloud through the circuit breaker and the rate
+        limiter, retrying transient errors. Returns the result and the time
+        the successful attempt took, failed attempts are recorded in stats.
+
+        Without wait, e.g. on the UI thread, the request is tried once and
+        fails right away while the breaker is open.
+        """
+        attempt = 0
+        while True:
+            if not self.breaker.wait(None if wait else 0):
+                raise throttle.CircuitOpenError(
+                    "SoundCloud is not responding, try again later")
+            self.limiter.acquire()
+            start = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
             except Exception as ex:
-                return {'error': str(ex)}
+                self.stats.record(operation, time.perf_counter() - start,
+                                  error=ex)
+                kind = throttle.classify(ex)
+                if kind != throttle.TRANSIENT:
+                    # SoundCloud answered, it just didn't like the request
+                    self.breaker.success()
+                    logger.warning('%s %s failed: %s', operation, args[0], ex)
+                    raise
+                if self.breaker.failure():
+                    logger.warning('pausing requests for %ss after %d '
+                                   'failures', self.breaker.cooldown,
+                                   self.breaker.failures)
+                if not wait or attempt >= self.max_retries:
+                    logger.warning('%s %s failed after %d attempts: %s',
+                                   operation, args[0], attempt + 1, ex)
+                    raise
+            else:
+                elapsed = time.perf_counter() - start
+                self.breaker.success()
+                return result, elapsed
+
+            delay = throttle.backoff(attempt, self.retry_base, self.retry_cap)
+            logger.info('retrying %s %s in %.1fs', operation, args[0], delay)
+            attempt += 1
+            time.sleep(delay)
+
+    def stream_info(self, url, margin=None, wait=True):
+        """
+        Gets info on a URL whose stream URL stays valid for at least margin
+        more seconds, re-resolving it if needed
+        """
+        if margin == None:
+            margin = self.expiry_margin
+        info = self.process_url(url, wait=wait)
+        if 'error' not in info and expires_soon(info, margin):
+            info = self.process_url(url, fresh=True, wait=wait)
+        return info
+
+    def raw_info(self, url):
+        """
+        Returns the full extract_info result spilled to the cache, if any
+        """
+        return self.cache.get('raw:' + utils.canonical_url(url, self.base))
 
     def fetch_url(self, url):
         """
         Fetches items in a SoundCloud list
+
+        Lists are always read in this process, their entries are generated
+        lazily and can't be handed over from a worker process. A list that is
+        still being read by another caller is shared with it.
         """
-        with self.ydl as ydl:
-            try:
-                if url[:8] != 'https://':
-                    url = self.base + url
+        key = utils.canonical_url(url, self.base)
+        with self._lock:
+            entries = self.lists.get(key)
+        if entries != None and not entries.done:
+            self.stats.record_coalesced('fetch_url')
+        else:
+            entries = self.flights.do('fetch_url', key, self._fetch_list,
+                                      key, url)
+        if isinstance(entries, dict):
+            # Error
+            return entries
+        result = dict(entries.info)
+        result['entries'] = entries
+        return result
 
-                return ydl.extract_info(url, download=False, process=False)
-            except Exception as ex:
-                return {'error': str(ex)}
+    def _fetch_list(self, key, url):
+        """
+        Requests a list, returns its SharedEntries or an error dict
+        """
+        if url[:8] != 'https://':
+            url = self.base + url
+
+        # Entries may still be read lazily afterwards, this times the request
+        # for the list itself
+        try:
+            result, elapsed = self._request(
+                'fetch_url', True, self.ydl_pool.get().extract_info, url,
+                download=False, process=False)
+        except Exception as ex:
+            return {'error': str(ex)}
+        self.stats.record('fetch_url', elapsed)
+
+        info = {field: value for field, value in result.items()
+                if field != 'entries'}
+        entries = SharedEntries(result.get('entries') or [], info)
+        # Forgotten once every reader is done with it
+        with self._lock:
+            self.lists[key] = entries
+        return entries
+
+    def stats_snapshot(self, audio_cache=None):
+        """
+        Returns fetch statistics, worker load, cache and connection counters,
+        and those of an audio cache if given
+        """
+        return self.stats.snapshot((self.pool, self.list_pool), self.cache,
+                                   connpool.shared_pool(), audio_cache)
+
+    def dump_stats(self, path, audio_cache=None):
+        """
+        Writes stats_snapshot to a JSON file, returns its expanded path
+        """
+        return self.stats.dump(path, (self.pool, self.list_pool), self.cache,
+                               connpool.shared_pool(), audio_cache)
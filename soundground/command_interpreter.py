@@ -5,7 +5,12 @@ Command Interpreter
 Runs commands
 """
 
+from soundground import stats
+
 class Interpreter(object):
+    # Default file for `stats dump'
+    stats_path = '~/.soundground/stats.json'
+
     def __init__(self, params):
         self.history = []
         self.textbox = params['textbox']
@@ -14,6 +19,7 @@ class Interpreter(object):
         self.player = params['player']
         self.cred = params['cred']
         self.cloudman = params['cloud']
+        self.playman = params['playman']
         self.done = False
 
     def validate(self, keycode):
@@ -46,8 +52,23 @@ class Interpreter(object):
             raise SystemExit(0)
         elif cmd[0] == 'playurl':
             # Play custom audio file by URL
-            self.player.set_mrl(cmd[1])
-            self.player.play()
+            self.player.play_url(cmd[1])
+        elif cmd[0] == 'play':
+            # Play the playlist, starting at the given index
+            index = int(cmd[1]) if len(cmd) > 1 else self.playlist.selected
+            items = self.playlist.items
+            if not 0 <= index < len(items) or not items[index].selectable:
+                # Messages and reports aren't tracks
+                self.statusline.notify("Nothing to play here")
+                return False
+            self.playman.load(items, index)
+            if not self.playman.play():
+                self.statusline.notify("Unable to play this track")
+                return False
+        elif cmd[0] == 'next':
+            self.playman.next()
+        elif cmd[0] == 'prev':
+            self.playman.previous()
         elif cmd[0] == 'login':
             # Check if logged in
             if self.cred.username != '':
@@ -57,6 +78,7 @@ class Interpreter(object):
             self.cred.username = self.statusline.prompt("Username: ")
             self.cred.password = self.statusline.prompt("Password: ", True)
             savecreds = self.statusline.prompt("Save credentials (y/N)? ")
+            self.cloudman.reset_extractors()
             self.statusline.notify("Temporarily logged in. Restart soundground to log out.")
             if len(savecreds) > 0 and savecreds[0].lower() == 'y':
                 self.statusline.notify("Logged in.")
@@ -66,37 +88,39 @@ class Interpreter(object):
             self.cred.username = ''
             self.cred.password = ''
             self.cred.save()
+            self.cloudman.reset_extractors()
             self.statusline.notify("Logged out.")
         elif cmd[0] == 'list':
             # Replace 'you' to actual username
             if cmd[1][:4] == "you/":
                 if len(self.cred.username) < 1:
-                    self.playlist.items.clear()
-                    self.playlist.add("Please log in")
+                    self.cloudman.cancel()
+                    self.playlist.replace_items(["Please log in"])
                     return False
                 listurl = self.cred.username + cmd[1][3:]
             else:
                 listurl = cmd[1]
 
             # Show temporary loading screen
-            self.playlist.items.clear()
-            self.playlist.add("Loading {}".format(listurl))
+            self.playlist.replace_items(["Loading {}".format(listurl)])
 
-            # Fetch list and display on playlist panel
-            items = self.cloudman.fetch_url(listurl)
-            self.playlist.items.clear()
-            if 'error' in items:
-                self.playlist.add(items['error'])
-                return False
-            entries = items['entries']
-
-            # Populate playlist
-            self.playlist.items.clear()
-            for entry in entries:
-                self.playlist.add(entry['url'])
-
-            # Start processing list
-            self.cloudman.async_process_playlist()
+            # Stream the list into the playlist panel, info on its entries is
+            # fetched as they arrive
+            self.cloudman.load_list(listurl)
+        elif cmd[0] == 'stats':
+            # Fetch statistics: summary, full report or JSON dump
+            audio_cache = self.playman.audio_cache
+            snapshot = self.cloudman.stats_snapshot(audio_cache)
+            if len(cmd) > 1 and cmd[1] == 'show':
+                # The report replaces the list, stop fetching for it
+                self.cloudman.cancel()
+                self.playlist.replace_items(stats.report(snapshot), False)
+            elif len(cmd) > 1 and cmd[1] == 'dump':
+                path = cmd[2] if len(cmd) > 2 else self.stats_path
+                path = self.cloudman.dump_stats(path, audio_cache)
+                self.statusline.notify("Statistics written to {}".format(path))
+            else:
+                self.statusline.notify(stats.summary(snapshot))
         else:
             self.statusline.notify("Unknown command `{}`".format(cmd[0]))
 
@@ -0,0 +1,329 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Connection Pool
+Keep-alive HTTP connections and cached DNS lookups shared by all YoutubeDL
+instances of a process
+"""
+
+import io
+import time
+import socket
+import functools
+import threading
+import http.client
+import urllib.error
+import urllib.request
+import urllib.response
+
+# Errors of a request on a reused connection that the server already closed
+STALE_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError,
+                BrokenPipeError, http.client.BadStatusLine)
+
+class DNSCache(object):
+    """
+    Remembers getaddrinfo results for `ttl` seconds
+    """
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def resolve(self, host, port):
+        """
+        Returns the stream socket addresses of host, from the cache if
+        possible
+        """
+        key = (host, port)
+        now = time.monotonic()
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry != None and entry[0] > now:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        addresses = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+        with self._lock:
+            self.entries[key] = (now + self.ttl, addresses)
+        return addresses
+
+    def forget(self, host, port):
+        with self._lock:
+            self.entries.pop((host, port), None)
+
+    def create_connection(self, address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT,
+                          source_address=None):
+        """
+        socket.create_connection with cached name resolution
+        """
+        host, port = address
+        error = None
+        for family, socktype, proto, canonname, sockaddr in \
+                self.resolve(host, port):
+            sock = None
+            try:
+                sock = socket.socket(family, socktype, proto)
+                if timeout is not socket._GLOBAL_DEFAULT_TIMEOUT:
+                    sock.settimeout(timeout)
+                if source_address:
+                    sock.bind(source_address)
+                sock.connect(sockaddr)
+                return sock
+            except OSError as ex:
+                error = ex
+                if sock != None:
+                    sock.close()
+
+        # The host may have moved, look it up again next time
+        self.forget(host, port)
+        if error != None:
+            raise error
+        raise OSError("getaddrinfo returned an empty list")
+
+class ConnectionPool(object):
+    """
+    Keep-alive HTTP and HTTPS connections, at most `max_per_host` per host
+
+    A connection is lent out for one request and comes back once its
+    response has been read, responses closed before the end take their
+    connection down with them. Requests to a host that has all its
+    connections lent out wait up to `wait_timeout` seconds for one to come
+    back, then use a connection of their own that is closed afterwards.
+    Connections idle for more than `idle_timeout` seconds are dropped,
+    servers close them anyway.
+    """
+
+    def __init__(self, max_per_host=4, idle_timeout=30, dns=None,
+                 wait_timeout=10):
+        self.max_per_host = max_per_host
+        self.idle_timeout = idle_timeout
+        self.wait_timeout = wait_timeout
+        if dns == None:
+            dns = DNSCache()
+        self.dns = dns
+
+        # Idle connections and their last use, and the number of connections,
+        # idle or lent out, by (scheme, host)
+        self.idle = {}
+        self.open = {}
+        self.created = 0
+        self.reused = 0
+        # Connections opened outside the pool after waiting too long
+        self.overflows = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, key, timeout=None):
+        """
+        Returns an idle connection for key, or None if a new one may be
+        opened, and whether the connection belongs to the pool. Blocks while
+        the host is at its limit, for at most timeout seconds, after which
+        the connection to open is one outside the pool.
+        """
+        deadline = None
+        if timeout != None:
+            deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                idle = self.idle.get(key)
+                while idle:
+                    conn, last_used = idle.pop()
+                    if (time.monotonic() - last_used < self.idle_timeout and
+                            conn.sock != None and conn.sock.fileno() != -1):
+                        self.reused += 1
+                        return conn, True
+                    conn.close()
+                    self.open[key] -= 1
+
+                if self.open.get(key, 0) < self.max_per_host:
+                    self.open[key] = self.open.get(key, 0) + 1
+                    self.created += 1
+                    return None, True
+
+                remaining = None
+                if deadline != None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.overflows += 1
+                        return None, False
+                self._cond.wait(remaining)
+
+    def release(self, key, conn):
+        """
+        Takes a connection back, closed connections free their slot
+        """
+        with self._cond:
+            if conn != None and conn.sock != None:
+                self.idle.setdefault(key, []).append((conn, time.monotonic()))
+            else:
+                self.open[key] -= 1
+            self._cond.notify()
+
+    def discard(self, key, conn):
+        if conn != None:
+            conn.close()
+        self.release(key, None)
+
+    def _finish(self, key, conn, pooled, reusable=True):
+        """
+        Gives back a connection done with its request, closing it unless it
+        is pooled and reusable
+        """
+        if not pooled:
+            conn.close()
+        elif reusable:
+            self.release(key, conn)
+        else:
+            self.discard(key, conn)
+
+    def close(self):
+        """
+        Closes all idle connections
+        """
+        with self._cond:
+            for key, idle in self.idle.items():
+                for conn, last_used in idle:
+                    conn.close()
+                self.open[key] -= len(idle)
+            self.idle = {}
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'connections_created': self.created,
+                'connections_reused': self.reused,
+                'connections_overflow': self.overflows,
+                'dns_hits': self.dns.hits,
+                'dns_misses': self.dns.misses,
+            }
+
+    def _connect(self, handler, http_class, req, http_conn_args):
+        conn = http_class(req.host, timeout=req.timeout, **http_conn_args)
+        conn.set_debuglevel(handler._debuglevel)
+        # youtube_dl only sets its own connect function for source_address
+        if conn._create_connection is socket.create_connection:
+            conn._create_connection = self.dns.create_connection
+        return conn
+
+    def do_open(self, handler, http_class, req, **http_conn_args):
+        """
+        Replaces AbstractHTTPHandler.do_open, sending the request over a
+        pooled connection
+        """
+        if not req.host:
+            raise urllib.error.URLError('no host given')
+        if req._tunnel_host:
+            # Proxy tunnels aren't pooled
+            return urllib.request.AbstractHTTPHandler.do_open(
+                handler, http_class, req, **http_conn_args)
+
+        headers = dict(req.unredirected_hdrs)
+        headers.update({k: v for k, v in req.headers.items()
+                        if k not in headers})
+        headers = {name.title(): value for name, value in headers.items()}
+
+        timeout = req.timeout
+        if timeout is socket._GLOBAL_DEFAULT_TIMEOUT:
+            timeout = socket.getdefaulttimeout()
+        wait = self.wait_timeout
+        if timeout != None and (wait == None or timeout < wait):
+            wait = timeout
+
+        key = (req.type, req.host)
+        conn, pooled = self.acquire(key, wait)
+        reused = conn != None
+        if not reused:
+            conn = self._connect(handler, http_class, req, http_conn_args)
+        else:
+            conn.sock.settimeout(timeout)
+
+        while True:
+            try:
+                conn.request(req.get_method(), req.selector, req.data, headers,
+                             encode_chunked=req.has_header('Transfer-encoding'))
+                response = conn.getresponse()
+                break
+            except STALE_ERRORS:
+                if not reused:
+                    self._finish(key, conn, pooled, False)
+                    raise
+                # The server dropped the idle connection, retry on a new one
+                conn.close()
+                reused = False
+                conn = self._connect(handler, http_class, req, http_conn_args)
+            except OSError as ex:
+                self._finish(key, conn, pooled, False)
+                raise urllib.error.URLError(ex)
+            except:
+                self._finish(key, conn, pooled, False)
+                raise
+
+        # Hand the connection back once the body has been read. Closing the
+        # response before the end leaves unread data on the connection.
+        close_conn = response._close_conn
+        close = response.close
+        complete = [True]
+
+        def release():
+            close_conn()
+            self._finish(key, conn, pooled, complete[0])
+
+        def close_early():
+            if not response.isclosed():
+                complete[0] = False
+            close()
+
+        if response.isclosed():
+            self._finish(key, conn, pooled)
+        else:
+            response._close_conn = release
+            response.close = close_early
+
+        response.url = req.get_full_url()
+        response.msg = response.reason
+        if response.status >= 400:
+            return self._buffer(response)
+        return response
+
+    def _buffer(self, response):
+        """
+        Reads an error response right away, so its connection comes back
+        even though error responses are often kept unread, e.g. by youtube_dl
+        errors. Returns an equivalent response with the body in memory.
+        """
+        try:
+            body = response.read()
+        finally:
+            response.close()
+        buffered = urllib.response.addinfourl(
+            io.BytesIO(body), response.headers, response.url, response.status)
+        buffered.msg = response.msg
+        return buffered
+
+    def install(self, opener):
+        """
+        Makes the HTTP and HTTPS handlers of a urllib opener, e.g. a
+        YoutubeDL's, use this pool
+        """
+        for handler in opener.handlers:
+            if isinstance(handler, (urllib.request.HTTPHandler,
+                                    urllib.request.HTTPSHandler)):
+                handler.do_open = functools.partial(self.do_open, handler)
+        return opener
+
+_shared = None
+_shared_lock = threading.Lock()
+
+def shared_pool():
+    """
+    Returns the pool shared by everything in this process
+    """
+    global _shared
+    with _shared_lock:
+        if _shared == None:
+            _shared = ConnectionPool()
+        return _shared
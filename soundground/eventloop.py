@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Event Loop
+Multiplexes file descriptors, timers and cross-thread callbacks so the UI
+thread sleeps until something actually happens
+"""
+
+import os
+import time
+import heapq
+import itertools
+import selectors
+import threading
+import collections
+
+class Timer(object):
+    """
+    Handle for a callback scheduled with EventLoop.call_later
+    """
+
+    def __init__(self, when, callback, args):
+        self.when = when
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+class EventLoop(object):
+    """
+    A minimal selector based event loop
+
+    Callbacks always run on the thread that called run(). Other threads hand
+    work over with call_soon_threadsafe, which wakes the loop through a
+    self-pipe.
+    """
+
+    def __init__(self):
+        self.selector = selectors.DefaultSelector()
+        self.running = False
+
+        self._pending = collections.deque()
+        self._timers = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+        # Self-pipe used to wake up select() from other threads
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_r, False)
+        os.set_blocking(self._wake_w, False)
+        self.selector.register(self._wake_r, selectors.EVENT_READ, self._drain_wakeup)
+
+    def add_reader(self, fd, callback):
+        """
+        Calls callback whenever fd becomes readable
+        """
+        self.selector.register(fd, selectors.EVENT_READ, callback)
+
+    def remove_reader(self, fd):
+        """
+        Stops watching fd
+        """
+        self.selector.unregister(fd)
+
+    def call_soon_threadsafe(self, callback, *args):
+        """
+        Schedules a callback on the loop thread, callable from any thread
+        """
+        self._pending.append((callback, args))
+        self._wakeup()
+
+    call_soon = call_soon_threadsafe
+
+    def call_later(self, delay, callback, *args):
+        """
+        Schedules a callback after delay seconds, returns a cancellable Timer
+        """
+        timer = Timer(time.monotonic() + delay, callback, args)
+        with self._lock:
+            heapq.heappush(self._timers, (timer.when, next(self._seq), timer))
+        self._wakeup()
+        return timer
+
+    def _wakeup(self):
+        """
+        Interrupts a blocking select()
+        """
+        try:
+            os.write(self._wake_w, b'\0')
+        except (BlockingIOError, OSError):
+            # Pipe is full, the loop is going to wake up anyway
+            pass
+
+    def _drain_wakeup(self):
+        """
+        Empties the self-pipe
+        """
+        try:
+            while os.read(self._wake_r, 4096):
+                pass
+        except (BlockingIOError, OSError):
+            pass
+
+    def _timeout(self):
+        """
+        Returns how long select() may block, None to block indefinitely
+        """
+        if self._pending:
+            return 0
+        with self._lock:
+            if not self._timers:
+                return None
+            return max(0, self._timers[0][0] - time.monotonic())
+
+    def _run_timers(self):
+        """
+        Runs timers that are due
+        """
+        now = time.monotonic()
+        due = []
+        with self._lock:
+            while self._timers and self._timers[0][0] <= now:
+                due.append(heapq.heappop(self._timers)[2])
+
+        for timer in due:
+            if not timer.cancelled:
+                timer.callback(*timer.args)
+
+    def _run_pending(self):
+        """
+        Runs callbacks posted from other threads
+        """
+        # Only run what's queued now, callbacks may post more work
+        for _ in range(len(self._pending)):
+            callback, args = self._pending.popleft()
+            callback(*args)
+
+    def run_once(self, timeout=None):
+        """
+        Waits for and dispatches a single round of events
+        """
+        wait = self._timeout()
+        if timeout != None:
+            wait = timeout if wait == None else min(wait, timeout)
+
+        for key, mask in self.selector.select(wait):
+            key.data()
+
+        self._run_timers()
+        self._run_pending()
+
+    def run(self):
+        """
+        Dispatches events until stop() is called
+        """
+        self.running = True
+        while self.running:
+            self.run_once()
+
+    def stop(self):
+        """
+        Stops the loop after the current iteration
+        """
+        self.running = False
+        self._wakeup()
+
+    def close(self):
+        self.selector.close()
+        os.close(self._wake_r)
+        os.close(self._wake_w)
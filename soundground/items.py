@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+List Items
+Compact representation of list rows and tracks
+"""
+
+import sys
+
+class ListItem(object):
+    """
+    A single list row or track
+
+    - caption:    the text displayed on the list
+    - selectable: if False, the item will skip selection
+    - value:      a custom value, could be used to specify a command to be
+                  executed when selected, or the track URL
+    - info:       some additional info, None until fetched
+
+    Items use __slots__ instead of a per-instance dict. On 64-bit CPython an
+    item costs 72 bytes including the GC header (object header plus four slot
+    pointers), against about 256 bytes for the dict with an empty info dict
+    used before. Captions and values are interned, so a track appearing in
+    several lists shares its strings.
+    """
+
+    __slots__ = ('caption', 'selectable', 'value', 'info')
+
+    def __init__(self, caption, selectable=True, value=None, info=None):
+        if value == None:
+            value = caption
+
+        self.caption = intern(caption)
+        self.selectable = selectable
+        self.value = intern(value)
+        self.info = info
+
+    def __repr__(self):
+        return 'ListItem({!r}, {!r}, {!r})'.format(
+            self.caption, self.selectable, self.value)
+
+def intern(value):
+    """
+    Interns strings, leaving any other value untouched
+    """
+    if type(value) is str:
+        return sys.intern(value)
+    return value
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Logging
+Debug log written by a background thread, off unless enabled with setup()
+"""
+
+import os
+import queue
+import atexit
+import logging
+import threading
+import logging.handlers
+
+LOG_PATH = os.path.join(os.path.expanduser("~/.soundground/"), "debug.log")
+
+LEVELS = {
+    'debug': logging.DEBUG,
+    'info': logging.INFO,
+    'warning': logging.WARNING,
+    'error': logging.ERROR,
+}
+
+# Everything in soundground logs below this logger. Until setup() is called
+# it drops all records with a single level check, and never falls back to
+# printing on stderr, which would garble the curses screen.
+logger = logging.getLogger('soundground')
+logger.addHandler(logging.NullHandler())
+logger.setLevel(logging.CRITICAL + 1)
+logger.propagate = False
+
+_writer = None
+
+class BatchFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    Size-rotated log file that is only flushed once per batch of records
+    """
+
+    def flush(self):
+        pass
+
+    def flush_batch(self):
+        with self.lock:
+            if self.stream:
+                self.stream.flush()
+
+class LogWriter(object):
+    """
+    Writes queued log records to a handler on a background thread
+
+    Records are written in batches, whatever piled up while the previous
+    batch was written goes out with a single flush.
+    """
+
+    # Most records written per flush
+    batch_size = 1000
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.queue = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self._run, name='log-writer')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            try:
+                while len(batch) < self.batch_size:
+                    batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                pass
+
+            for record in batch:
+                if record == None:
+                    # Stop sentinel, nothing is queued after it
+                    self.handler.flush_batch()
+                    return
+                self.handler.handle(record)
+            self.handler.flush_batch()
+
+    def stop(self):
+        """
+        Writes out all queued records and stops the thread
+        """
+        self.queue.put(None)
+        self.thread.join()
+        self.handler.close()
+
+def get_logger(name):
+    """
+    Returns the logger of a soundground module
+    """
+    if not name.startswith('soundground'):
+        name = 'soundground.' + name
+    return logging.getLogger(name)
+
+def setup(level='debug', path=None, max_bytes=1024 ** 2, backups=3):
+    """
+    Starts logging records of at least `level` to `path`, which is rotated
+    once it grows past max_bytes, keeping `backups` old files
+    """
+    global _writer
+    shutdown()
+
+    if path == None:
+        path = LOG_PATH
+    path = os.path.expanduser(path)
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+
+    handler = BatchFileHandler(path, maxBytes=max_bytes, backupCount=backups,
+                               encoding='utf-8')
+    handler.setFormatter(logging.Formatter(
+        '%(asctime)s %(levelname)-7s %(threadName)s %(name)s: %(message)s'))
+    _writer = LogWriter(handler)
+
+    for old in list(logger.handlers):
+        logger.removeHandler(old)
+    logger.addHandler(logging.handlers.QueueHandler(_writer.queue))
+    logger.setLevel(LEVELS.get(level, level))
+    return path
+
+def shutdown():
+    """
+    Flushes the log and turns logging off again
+    """
+    global _writer
+    if _writer == None:
+        return
+    writer, _writer = _writer, None
+
+    for old in list(logger.handlers):
+        logger.removeHandler(old)
+    logger.addHandler(logging.NullHandler())
+    logger.setLevel(logging.CRITICAL + 1)
+    writer.stop()
+
+atexit.register(shutdown)
@@ -2,15 +2,22 @@
 # -*- coding: utf-8 -*-
 """Program entry point"""
 
+import time
+# Taken before anything else is imported, for --startup-profile
+_import_start = time.perf_counter()
+
 import argparse
+import os
 import sys
+import signal
 import curses
 import curses.textpad
-import vlc
 
-from soundground import metadata, utils, credman, cloudman
+# Heavy modules (vlc, youtube_dl via cloudman) are imported after the first
+# frame has been painted
+from soundground import metadata, utils, credman, log
 from soundground import winman as wm
-from soundground import command_interpreter
+from soundground import command_interpreter, eventloop, playman, audiocache
 from soundground.winman import Value
 
 def refresh_nav(navlist, cred=None):
@@ -98,35 +105,117 @@ def init_windows(wg):
     }
 
 
-def main(stdscr):
+def main(argv):
     """
     Program entry point.
-    """
 
-    # Initialize media player
-    mp = vlc.MediaPlayer()
-
-    # Initialize screen
+    :param argv: command-line arguments
+    :type argv: :class:`list`
+    """
+    arg_parser = argparse.ArgumentParser(
+        prog=argv[0],
+        description=metadata.description)
+    arg_parser.add_argument(
+        '-V', '--version',
+        action='store_true',
+        help="show program's version number and exit")
+    arg_parser.add_argument(
+        '--startup-profile',
+        action='store_true',
+        help='report how long each startup phase took on exit')
+    arg_parser.add_argument(
+        '--crossfade',
+        type=float, default=0, metavar='SECONDS',
+        help='crossfade between tracks, gapless without it')
+    arg_parser.add_argument(
+        '--processes',
+        type=int, default=0, metavar='N',
+        help='extract track info in N worker processes instead of threads')
+    arg_parser.add_argument(
+        '--log-level',
+        choices=sorted(log.LEVELS), default=None,
+        help='write a debug log, off by default')
+    arg_parser.add_argument(
+        '--log-file',
+        default=log.LOG_PATH, metavar='PATH',
+        help='log file, rotated when it grows past 1 MiB')
+
+    args = arg_parser.parse_args(args=argv[1:])
+    if args.version:
+        print('{0} {1}'.format(metadata.project, metadata.version), file=sys.stderr)
+        raise SystemExit(0)
+
+    if args.log_level != None:
+        log.setup(args.log_level, args.log_file)
+
+    timer = utils.PhaseTimer(_import_start)
+    timer.mark('import main')
+    try:
+        return curses.wrapper(run, args, timer)
+    finally:
+        log.shutdown()
+        if args.startup_profile:
+            print(timer.report(), file=sys.stderr)
+
+
+def init_screen(stdscr):
+    """
+    Sets up windows and paints the first frame, before anything heavy is
+    loaded
+    """
+    # Initialize screen, input is read when stdin becomes readable
     stdscr.clear()
-    stdscr.timeout(100)
+    stdscr.nodelay(True)
     wg = wm.WindowGroup(stdscr)
     controls = init_windows(wg)
 
+    # Start credentials manager
+    cred = credman.Credentials()
+    cred.load()
+    refresh_nav(controls['nav'], cred)
+
+    # Force redraw windows
+    wg.resize()
+    return wg, controls, cred
+
+
+def run(stdscr, args, timer=None):
+    """
+    Runs the user interface until quit.
+    """
+    if timer == None:
+        timer = utils.PhaseTimer()
+
+    wg, controls, cred = init_screen(stdscr)
+    timer.mark('first frame')
+
+    # Initialize media player
+    from soundground import player
+    loop = eventloop.EventLoop()
+    mp = player.Player(loop=loop, crossfade=args.crossfade)
+    timer.mark('init player')
+
     # Create status bar on top of the command bar
-    statusline = wm.StatusLine(wg['command'], mp)
+    statusline = wm.StatusLine(wg['command'], mp, loop)
     wg.extra_draws.append(statusline)
 
     # Keep track of active control
     active_list = ['nav', 'playlist']
     active_index = 0
 
-    # Start credentials manager
-    cred = credman.Credentials()
-    cred.load()
-    refresh_nav(controls['nav'], cred)
+    # Time of the last q press, q has to be held (or pressed twice) to quit
+    quit_pressed = 0
+
+    from soundground import cloudman
+    timer.mark('import cloudman')
 
-    # Initialize SoundCloud manager with credentials
-    cm = cloudman.CloudManager(cred, controls['playlist'])
+    # Initialize SoundCloud manager with credentials, fetch workers hand
+    # playlist changes over to the loop thread
+    updates = wm.UpdateQueue(loop)
+    cm = cloudman.CloudManager(cred, controls['playlist'], updates=updates,
+                               processes=args.processes)
+    pm = playman.PlaylistManager(cm, mp, audio_cache=audiocache.AudioCache())
+    timer.mark('init cloudman')
 
     # Pass command box control to interpreter
     ci_params = {
@@ -135,26 +224,59 @@ def main(stdscr):
         'statusline': statusline,
         'player': mp,
         'cred': cred,
-        'cloud': cm
+        'cloud': cm,
+        'playman': pm
     }
     ci = command_interpreter.Interpreter(ci_params)
 
-    # Force redraw windows
-    wg.resize()
-
-    last_command = ''
-    while True:
+    def refresh_status():
+        """
+        Redraws the status bar
+        """
         # Clear command box if not editing
         if ci.done:
             statusline.draw()
 
-        # Read input
-        c = stdscr.getch()
+    # Player events keep the status bar up to date
+    statusline.attach()
+
+    # Continue with the next track if it couldn't be preloaded, outside of
+    # VLC's event thread
+    mp.event_manager().event_attach(
+        mp.vlc.EventType.MediaPlayerEndReached,
+        lambda event: loop.call_soon_threadsafe(pm.next))
+
+    def on_resize():
+        """
+        Applies the new terminal size
+        """
+        lines, cols = stdscr.getmaxyx()
+        try:
+            size = os.get_terminal_size(sys.__stdout__.fileno())
+            lines, cols = size.lines, size.columns
+        except OSError:
+            pass
+        curses.resizeterm(lines, cols)
+        wg.resize()
+
+    # Python's handler replaces the curses one, so resize ourselves
+    signal.signal(signal.SIGWINCH,
+                  lambda signum, frame: loop.call_soon_threadsafe(on_resize))
+
+    def handle_key(c):
+        """
+        Processes a single keypress
+        """
+        nonlocal active_index, quit_pressed
+
         if c == ord('q'):
             # Quit
+            now = time.monotonic()
+            if now - quit_pressed < 1:
+                loop.stop()
+                return
+            quit_pressed = now
             statusline.notify("Hold q to quit")
-            if stdscr.getch() == ord('q'):
-                break
 
         elif c == ord(':'):
             # Enter command mode
@@ -162,6 +284,7 @@ def main(stdscr):
             wg['command'].addch(':')
             ci.done = False
             controls['cmd'].edit(ci.validate)
+            statusline.invalidate()
 
         elif c in {ord('j'), ord('k'), curses.KEY_DOWN, curses.KEY_UP}:
             # Process up/down selection
@@ -199,8 +322,15 @@ def main(stdscr):
             item = controls[active].items[index]
             if active == 'nav':
                 # Select nav item
-                ci.execute(item['value'])
+                ci.execute(item.value)
                 refresh_nav(controls['nav'], cred)
+            elif active == 'playlist':
+                # Play from the selected track
+                ci.execute('play {}'.format(index))
+
+        elif c in {ord('n'), ord('p')}:
+            # Skip to next/previous track
+            ci.execute('next' if c == ord('n') else 'prev')
 
         elif c in {ord('-'), ord('='), ord('+')}:
             # Volume control
@@ -227,12 +357,35 @@ def main(stdscr):
         if c == curses.KEY_RESIZE:
             wg.resize()
 
+    def on_input():
+        """
+        Drains all pending keypresses
+        """
+        while loop.running:
+            c = stdscr.getch()
+            if c == -1:
+                break
+            handle_key(c)
+        refresh_status()
+
+    loop.add_reader(sys.stdin.fileno(), on_input)
+
+    # Redraw windows now that the status bar exists
+    wg.resize()
+    refresh_status()
+    timer.mark('ready')
+
+    try:
+        loop.run()
+    finally:
+        loop.close()
+
     return 0
 
 
 def entry_point():
     """Zero-argument entry point for use with setuptools/distribute."""
-    raise SystemExit(curses.wrapper(main))
+    raise SystemExit(main(sys.argv))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,257 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Player
+Gapless playback engine built on two VLC media players
+"""
+
+import threading
+
+class Player(object):
+    """
+    Plays tracks on one VLC media player while the next track is opened and
+    buffered, paused, on a standby player
+
+    At the end of a track (or `crossfade` seconds before it) the standby
+    player takes over, so track changes don't rebuild the decode pipeline.
+    The rest of soundground talks to this class instead of a raw
+    vlc.MediaPlayer; it mirrors the MediaPlayer methods it needs, including
+    event_manager(), whose events only come from the active player.
+    """
+
+    # Number of volume steps used for a crossfade
+    fade_steps = 10
+
+    def __init__(self, instance=None, loop=None, crossfade=0):
+        import vlc
+        self.vlc = vlc
+
+        if instance == None:
+            instance = vlc.Instance()
+        self.instance = instance
+        self.loop = loop
+        self.crossfade = crossfade
+
+        self.players = [instance.media_player_new(), instance.media_player_new()]
+        self.active = 0
+        self.volume = 100
+
+        # URL loaded on the standby player, if any
+        self.standby_url = None
+        self.fading = False
+        # URL to preload once a crossfade is over
+        self.deferred_url = None
+        # Length of the active track, from its events
+        self.length = 0
+
+        # Listeners by event type, see event_attach
+        self.listeners = {}
+        # Called with the URL that took over after a gapless hand-off
+        self.on_advance = []
+
+        self._lock = threading.RLock()
+        for index, player in enumerate(self.players):
+            events = player.event_manager()
+            for event_type in (vlc.EventType.MediaPlayerPlaying,
+                               vlc.EventType.MediaPlayerPaused,
+                               vlc.EventType.MediaPlayerStopped,
+                               vlc.EventType.MediaPlayerEndReached,
+                               vlc.EventType.MediaPlayerPositionChanged,
+                               vlc.EventType.MediaPlayerLengthChanged,
+                               vlc.EventType.MediaPlayerAudioVolume):
+                events.event_attach(event_type, self._player_event, index)
+
+    @property
+    def player(self):
+        """
+        The media player currently heard
+        """
+        return self.players[self.active]
+
+    @property
+    def standby(self):
+        return self.players[1 - self.active]
+
+    def _call(self, callback, *args):
+        """
+        Runs callback outside of VLC's event thread
+        """
+        if self.loop != None:
+            self.loop.call_soon_threadsafe(callback, *args)
+        else:
+            threading.Thread(target=callback, args=args).start()
+
+    def _player_event(self, event, index):
+        """
+        Receives events from both media players on the VLC thread
+        """
+        if index != self.active:
+            # The standby player is silent, its events are internal
+            return
+
+        if event.type == self.vlc.EventType.MediaPlayerEndReached:
+            if self.standby_url != None:
+                # Hand off instead of reporting the end of the track
+                self._call(self._hand_off)
+                return
+        elif event.type == self.vlc.EventType.MediaPlayerLengthChanged:
+            self.length = event.u.new_length
+        elif (event.type == self.vlc.EventType.MediaPlayerPositionChanged and
+              self.crossfade > 0 and self.standby_url != None and not self.fading):
+            self._check_crossfade(event.u.new_position)
+
+        for callback, args in self.listeners.get(event.type, []):
+            callback(event, *args)
+
+    def _check_crossfade(self, position):
+        """
+        Starts the crossfade once the active track is close enough to its end
+        """
+        # Uses the length from events, the player must not be called back
+        # from inside its own event thread
+        length = self.length
+        if length > 0 and (1 - position) * length <= self.crossfade * 1000:
+            self.fading = True
+            self._call(self._hand_off)
+
+    def event_manager(self):
+        """
+        Returns an object to attach event listeners to, like MediaPlayer does
+        """
+        return self
+
+    def event_attach(self, event_type, callback, *args):
+        """
+        Calls callback(event, *args) on events of the active player
+        """
+        self.listeners.setdefault(event_type, []).append((callback, args))
+
+    def _media(self, url, paused=False):
+        media = self.instance.media_new(url)
+        if paused:
+            # Open and buffer the media, but hold it on the first frame
+            media.add_option(':start-paused')
+        return media
+
+    def play_url(self, url):
+        """
+        Plays a URL, taking over from the standby player if it has it loaded
+        """
+        with self._lock:
+            if url == self.standby_url:
+                # Whoever asked for this URL already knows it's playing
+                self._hand_off(False)
+                return
+
+            self.player.set_media(self._media(url))
+            self.player.audio_set_volume(self.volume)
+            self.player.play()
+            self.fading = False
+
+    def preload(self, url):
+        """
+        Opens and buffers the next track on the standby player
+        """
+        with self._lock:
+            if url == self.standby_url:
+                return
+            if self.fading:
+                # The standby player is still fading out the previous track
+                self.deferred_url = url
+                return
+            self.standby.stop()
+            self.standby.set_media(self._media(url, True))
+            self.standby.audio_set_volume(0 if self.crossfade > 0 else self.volume)
+            self.standby.play()
+            self.standby_url = url
+
+    def _hand_off(self, advance=True):
+        """
+        Swaps the standby player in, fading over if crossfade is set. Unless
+        advance is False, on_advance listeners are told about the new track.
+        """
+        with self._lock:
+            url = self.standby_url
+            if url == None:
+                return
+
+            previous = self.player
+            self.active = 1 - self.active
+            self.standby_url = None
+            self.length = self.player.get_length()
+
+            if self.crossfade > 0 and self.loop != None:
+                self.fading = True
+                self.player.audio_set_volume(0)
+                self.player.set_pause(0)
+                self._fade(previous, 1)
+            else:
+                previous.stop()
+                self.player.audio_set_volume(self.volume)
+                self.player.set_pause(0)
+                self.fading = False
+
+        if advance:
+            for callback in self.on_advance:
+                callback(url)
+
+    def _fade(self, previous, step):
+        """
+        Moves one crossfade step from the previous to the active player
+        """
+        with self._lock:
+            level = self.volume * step // self.fade_steps
+            self.player.audio_set_volume(level)
+            previous.audio_set_volume(self.volume - level)
+            if step >= self.fade_steps:
+                previous.stop()
+                self.fading = False
+                url, self.deferred_url = self.deferred_url, None
+                if url != None:
+                    self.preload(url)
+                return
+
+        self.loop.call_later(float(self.crossfade) / self.fade_steps,
+                             self._fade, previous, step + 1)
+
+    # MediaPlayer compatible interface, applied to the active player
+
+    def set_mrl(self, mrl):
+        with self._lock:
+            self.player.set_media(self._media(mrl))
+
+    def play(self):
+        with self._lock:
+            self.player.audio_set_volume(self.volume)
+            return self.player.play()
+
+    def stop(self):
+        with self._lock:
+            self.standby.stop()
+            self.standby_url = None
+            self.player.stop()
+
+    def pause(self):
+        self.player.pause()
+
+    def can_pause(self):
+        return self.player.can_pause()
+
+    def is_playing(self):
+        return self.player.is_playing()
+
+    def get_title(self):
+        return self.player.get_title()
+
+    def get_length(self):
+        return self.player.get_length()
+
+    def get_position(self):
+        return self.player.get_position()
+
+    def audio_get_volume(self):
+        return self.volume
+
+    def audio_set_volume(self, volume):
+        self.volume = volume
+        return self.player.audio_set_volume(volume)
@@ -5,13 +5,267 @@ Playlist Manager
 Manages the local music queue
 """
 
+import time
+import threading
+
+from soundground import utils
+from soundground.utils import expires_soon
+from soundground.items import ListItem
+from soundground.workers import WorkerPool
+
 class PlaylistManager(object):
-    def __init__(self):
+    """
+    Play queue that resolves upcoming tracks in the background
+
+    While a track plays, the stream URL and metadata of the next `lookahead`
+    tracks are resolved, so changing tracks doesn't wait for an extraction.
+    With an audio cache, upcoming tracks are also downloaded ahead and played
+    from disk.
+    """
+
+    # Queued tracks get a new stream URL this many seconds before expiry
+    refresh_margin = 60
+
+    def __init__(self, cloud=None, player=None, lookahead=3, audio_cache=None):
+        # List of ListItem, shared with SelectableList rows where possible
         self.tracklist = []
         self.play_index = 0
+        self.cloud = cloud
+        self.player = player
+        self.lookahead = lookahead
+
+        # Resolved info by track URL, and lookups still in progress
+        self.resolved = {}
+        self.pending = {}
+        self._lock = threading.Lock()
+        self.pool = WorkerPool(2, 'lookahead')
+        self._refresh_timer = None
+
+        # Read-ahead downloads, one at a time to leave bandwidth for playback,
+        # and the keys queued for download
+        self.audio_cache = audio_cache
+        self.downloads = WorkerPool(1, 'readahead')
+        self.reading = set()
+
+        # Follow gapless hand-offs done by the player
+        if player != None:
+            player.on_advance.append(self._advanced)
 
     def queue(self, url):
         """
         Adds a track or playlist to the queue
         """
-        pass
+        if isinstance(url, ListItem):
+            self.tracklist.append(url)
+        else:
+            self.tracklist.append(ListItem(url))
+        self.prefetch()
+
+    def load(self, items, index=0):
+        """
+        Replaces the queue with a list of items, starting at index
+        """
+        self.tracklist = list(items)
+        self.play_index = index
+        self.prefetch()
+
+    def current(self):
+        """
+        Returns the item being played, or None
+        """
+        if 0 <= self.play_index < len(self.tracklist):
+            return self.tracklist[self.play_index]
+        return None
+
+    def _known(self, item, margin=0):
+        """
+        Returns resolved info for an item whose stream URL is still valid for
+        margin seconds, or None
+        """
+        for info in (item.info, self.resolved.get(item.value)):
+            if info != None and not expires_soon(info, margin):
+                return info
+        return None
+
+    def resolve(self, item):
+        """
+        Resolves an item's stream URL and metadata, blocking if needed. Runs
+        on the UI thread, so a failed lookup isn't retried.
+        """
+        info = self._known(item, self.refresh_margin)
+        if info != None:
+            return info
+
+        # Join a lookup already in progress
+        with self._lock:
+            job = self.pending.get(item.value)
+        if job != None:
+            job.wait()
+            info = self._known(item, self.refresh_margin)
+            if info != None:
+                return info
+
+        return self._resolve(item, False)
+
+    def _resolve(self, item, wait=True):
+        """
+        Looks up an item through the cloud manager and remembers the result
+        """
+        try:
+            info = self.cloud.stream_info(item.value, self.refresh_margin,
+                                          wait)
+            if 'error' not in info:
+                with self._lock:
+                    self.resolved[item.value] = info
+                # The track after the current one can be buffered now
+                if self._next_item() is item:
+                    self._preload_next()
+                if item is not self.current():
+                    self._read_ahead(item, info)
+            return info
+        finally:
+            with self._lock:
+                self.pending.pop(item.value, None)
+
+    def prefetch(self):
+        """
+        Resolves the tracks following the current one in the background
+        """
+        if self.cloud == None:
+            return
+
+        start = self.play_index + 1
+        upcoming = self.tracklist[start:start + self.lookahead]
+        for item in upcoming:
+            info = self._known(item, self.refresh_margin)
+            if info != None:
+                # Rows loaded with their info still need downloading
+                self._read_ahead(item, info)
+                continue
+            with self._lock:
+                if item.value in self.pending:
+                    continue
+                self.pending[item.value] = self.pool.submit(self._resolve, item)
+
+        self._schedule_refresh(upcoming)
+
+    def _schedule_refresh(self, upcoming):
+        """
+        Runs prefetch again when the first queued stream URL is about to
+        expire
+        """
+        expiries = [info['expires'] for info in map(self._known, upcoming)
+                    if info != None and 'expires' in info]
+        if self._refresh_timer != None:
+            self._refresh_timer.cancel()
+            self._refresh_timer = None
+        if not expiries:
+            return
+
+        delay = max(1, min(expiries) - self.refresh_margin - time.time())
+        self._refresh_timer = threading.Timer(delay, self.prefetch)
+        self._refresh_timer.daemon = True
+        self._refresh_timer.start()
+
+    def play(self, index=None):
+        """
+        Plays the item at index, or the current item
+        """
+        if index != None:
+            self.play_index = index
+
+        item = self.current()
+        if item == None:
+            return False
+
+        info = self.resolve(item)
+        self.prefetch()
+        if 'error' in info:
+            return False
+
+        self.player.play_url(self._playable_url(item, info))
+        self._preload_next()
+        return True
+
+    def _cache_key(self, item):
+        return utils.canonical_url(item.value)
+
+    def _playable_url(self, item, info):
+        """
+        Returns the local copy of a track if cached, its stream URL otherwise
+        """
+        if self.audio_cache != None:
+            path = self.audio_cache.get(self._cache_key(item))
+            if path != None:
+                return path
+        return info['url']
+
+    def _read_ahead(self, item, info):
+        """
+        Downloads an upcoming track into the audio cache in the background
+        """
+        if self.audio_cache == None:
+            return
+        # Segmented (HLS) streams can't be stored as a single file
+        if info.get('protocol', 'https') not in {'http', 'https'}:
+            return
+        key = self._cache_key(item)
+        with self._lock:
+            if key in self.reading or self.audio_cache.contains(key):
+                return
+            self.reading.add(key)
+        self.downloads.submit(self._download, key, info['url'])
+
+    def _download(self, key, url):
+        try:
+            return self.audio_cache.download(key, url)
+        finally:
+            with self._lock:
+                self.reading.discard(key)
+
+    def _next_item(self):
+        """
+        Returns the item after the current one, or None
+        """
+        index = self.play_index + 1
+        if index < len(self.tracklist):
+            return self.tracklist[index]
+        return None
+
+    def _preload_next(self):
+        """
+        Has the player buffer the next track if it's already resolved
+        """
+        item = self._next_item()
+        if item == None:
+            return
+        info = self._known(item)
+        if info != None:
+            self.player.preload(self._playable_url(item, info))
+
+    def _advanced(self, url):
+        """
+        Called when the player moved on to the preloaded track by itself
+        """
+        item = self._next_item()
+        if item == None:
+            return
+        self.play_index += 1
+        self.prefetch()
+        self._preload_next()
+
+    def next(self):
+        """
+        Skips to the next track
+        """
+        if self.play_index + 1 >= len(self.tracklist):
+            return False
+        return self.play(self.play_index + 1)
+
+    def previous(self):
+        """
+        Goes back to the previous track
+        """
+        if self.play_index < 1:
+            return False
+        return self.play(self.play_index - 1)
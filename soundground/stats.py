@@ -0,0 +1,246 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Fetch Statistics
+Timing histograms and error counters for extractions and worker queues
+"""
+
+import os
+import json
+import time
+import bisect
+import threading
+import collections
+
+class Histogram(object):
+    """
+    Counts durations in fixed, roughly logarithmic millisecond buckets, so
+    recording is cheap and memory doesn't grow with the number of samples
+    """
+
+    # Upper bounds of the buckets in milliseconds, the last bucket is open
+    bounds = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000,
+              30000)
+
+    def __init__(self):
+        self.buckets = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        millis = seconds * 1000
+        self.buckets[bisect.bisect_left(self.bounds, millis)] += 1
+        self.count += 1
+        self.total += millis
+        if millis > self.max:
+            self.max = millis
+
+    def percentile(self, fraction):
+        """
+        Returns the upper bound of the bucket the given fraction of samples
+        fall into, in milliseconds
+        """
+        if self.count == 0:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank and count:
+                if index < len(self.bounds):
+                    return float(min(self.bounds[index], self.max))
+                return self.max
+        return self.max
+
+    def to_dict(self):
+        labels = ['<={}'.format(bound) for bound in self.bounds]
+        labels.append('>{}'.format(self.bounds[-1]))
+        return {
+            'count': self.count,
+            'mean_ms': self.total / self.count if self.count else 0.0,
+            'p50_ms': self.percentile(0.5),
+            'p95_ms': self.percentile(0.95),
+            'max_ms': self.max,
+            'buckets_ms': dict(zip(labels, self.buckets)),
+        }
+
+class Operation(object):
+    """
+    Counters of a single kind of extraction, e.g. process_url
+    """
+
+    def __init__(self):
+        self.time = Histogram()
+        self.bytes = 0
+        self.errors = collections.Counter()
+        # Calls that shared the result of an identical one in progress
+        self.coalesced = 0
+
+    def to_dict(self):
+        result = self.time.to_dict()
+        result['bytes'] = self.bytes
+        result['coalesced'] = self.coalesced
+        result['errors'] = dict(self.errors)
+        return result
+
+def error_type(error):
+    """
+    Returns the name of the error behind an exception, looking through the
+    DownloadError youtube_dl wraps everything in
+    """
+    # Errors passed back from worker processes keep the original name
+    if getattr(error, 'error_type', None) != None:
+        return error.error_type
+    exc_info = getattr(error, 'exc_info', None)
+    if exc_info and exc_info[0] != None:
+        return exc_info[0].__name__
+    return type(error).__name__
+
+class FetchStats(object):
+    """
+    Collects extraction times, sizes and errors by operation, and queue wait
+    times by worker pool
+
+    Every method is thread-safe. Recording only updates counters, formatting
+    happens when a snapshot is taken.
+    """
+
+    def __init__(self):
+        self.operations = collections.defaultdict(Operation)
+        self.waits = collections.defaultdict(Histogram)
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def record(self, operation, seconds, size=0, error=None):
+        """
+        Records one extraction, error being the exception it raised if any
+        """
+        with self._lock:
+            counters = self.operations[operation]
+            counters.time.add(seconds)
+            counters.bytes += size
+            if error != None:
+                counters.errors[error_type(error)] += 1
+
+    def record_coalesced(self, operation):
+        """
+        Records a call that joined an identical one instead of running
+        """
+        with self._lock:
+            self.operations[operation].coalesced += 1
+
+    def record_wait(self, pool, seconds):
+        """
+        Records how long a job sat in a worker pool's queue
+        """
+        with self._lock:
+            self.waits[pool].add(seconds)
+
+    def snapshot(self, pools=(), cache=None, connections=None,
+                 audio_cache=None):
+        """
+        Returns all statistics as a JSON-serializable dict, including the
+        current load of the given worker pools and the counters of a cache,
+        a connection pool and an audio cache
+        """
+        with self._lock:
+            result = {
+                'uptime': time.time() - self.started,
+                'operations': {name: counters.to_dict()
+                               for name, counters in self.operations.items()},
+                'queue_wait': {name: histogram.to_dict()
+                               for name, histogram in self.waits.items()},
+            }
+        result['workers'] = {pool.name: {'busy': pool.busy,
+                                         'size': pool.n_workers,
+                                         'queued': pool.jobs.qsize()}
+                             for pool in pools}
+        if cache != None:
+            result['cache'] = cache.stats()
+        if connections != None:
+            result['connections'] = connections.stats()
+        if audio_cache != None:
+            result['audio_cache'] = audio_cache.stats()
+        return result
+
+    def dump(self, path, pools=(), cache=None, connections=None,
+             audio_cache=None):
+        """
+        Writes a snapshot to a JSON file for offline analysis
+        """
+        path = os.path.expanduser(path)
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        with open(path, 'w') as stats_file:
+            json.dump(self.snapshot(pools, cache, connections, audio_cache),
+                      stats_file, indent=2, sort_keys=True)
+        return path
+
+def summary(snapshot):
+    """
+    Returns a one-line summary of a snapshot for the status bar
+    """
+    parts = []
+    for name, op in sorted(snapshot['operations'].items()):
+        errors = sum(op['errors'].values())
+        parts.append("{} {}x p50 {:.0f}ms p95 {:.0f}ms {} err".format(
+            name, op['count'], op['p50_ms'], op['p95_ms'], errors))
+    for name, load in sorted(snapshot['workers'].items()):
+        parts.append("{} {}/{} busy {} queued".format(
+            name, load['busy'], load['size'], load['queued']))
+    if not parts:
+        return "No fetches yet"
+    return " | ".join(parts)
+
+def report(snapshot):
+    """
+    Returns a snapshot as lines of text for the playlist panel
+    """
+    lines = ["Fetch statistics, {:.0f}s uptime".format(snapshot['uptime'])]
+    for name, op in sorted(snapshot['operations'].items()):
+        lines.append("")
+        lines.append("{}: {} calls, {} shared, {} KiB".format(
+            name, op['count'], op['coalesced'], op['bytes'] // 1024))
+        lines.append("  time mean {:.0f}ms p50 {:.0f}ms p95 {:.0f}ms "
+                     "max {:.0f}ms".format(op['mean_ms'], op['p50_ms'],
+                                           op['p95_ms'], op['max_ms']))
+        for bucket, count in op['buckets_ms'].items():
+            if count:
+                lines.append("  {:>8} ms {:>6}".format(bucket, count))
+        for error, count in sorted(op['errors'].items()):
+            lines.append("  error {} x{}".format(error, count))
+
+    for name, wait in sorted(snapshot['queue_wait'].items()):
+        lines.append("")
+        lines.append("{} queue wait: mean {:.0f}ms p95 {:.0f}ms "
+                     "max {:.0f}ms".format(name, wait['mean_ms'],
+                                           wait['p95_ms'], wait['max_ms']))
+    for name, load in sorted(snapshot['workers'].items()):
+        lines.append("{} workers: {}/{} busy, {} queued".format(
+            name, load['busy'], load['size'], load['queued']))
+
+    if 'cache' in snapshot:
+        cache = snapshot['cache']
+        lines.append("")
+        lines.append("cache: {} hits, {} misses, {:.0%} hit rate".format(
+            cache['hits'], cache['misses'], cache['hit_rate']))
+
+    if 'connections' in snapshot:
+        connections = snapshot['connections']
+        lines.append("connections: {} opened, {} reused, {} outside the pool, "
+                     "DNS {} cached, {} looked up".format(
+                         connections['connections_created'],
+                         connections['connections_reused'],
+                         connections['connections_overflow'],
+                         connections['dns_hits'], connections['dns_misses']))
+
+    if 'audio_cache' in snapshot:
+        audio = snapshot['audio_cache']
+        lines.append("audio cache: {} hits, {} misses, {:.1f} MiB saved, "
+                     "{:.1f} MiB downloaded".format(
+                         audio['hits'], audio['misses'],
+                         audio['bytes_saved'] / 1024.0 / 1024.0,
+                         audio['bytes_downloaded'] / 1024.0 / 1024.0))
+    return lines
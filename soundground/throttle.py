@@ -0,0 +1,247 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Throttling
+Rate limiting, retry backoff, circuit breaking and negative caching for
+requests to SoundCloud
+"""
+
+import re
+import time
+import random
+import socket
+import threading
+import urllib.error
+
+TRANSIENT = 'transient'
+PERMANENT = 'permanent'
+
+# HTTP status codes worth retrying, and those that won't change on a retry
+TRANSIENT_CODES = {408, 425, 429, 500, 502, 503, 504}
+PERMANENT_CODES = {401, 403, 404, 410}
+
+# Names of network errors, for errors passed back from worker processes
+TRANSIENT_TYPES = {'timeout', 'TimeoutError', 'URLError', 'ConnectionError',
+                   'ConnectionResetError', 'ConnectionRefusedError',
+                   'RemoteDisconnected', 'IncompleteRead'}
+
+HTTP_ERROR = re.compile(r'HTTP Error (\d{3})')
+
+class CircuitOpenError(Exception):
+    """
+    A request that wasn't sent because the circuit breaker is open
+    """
+
+def _causes(error, depth=5):
+    """
+    Yields an error and the errors it wraps: youtube_dl's exc_info and
+    cause, urllib's reason, and chained exceptions
+    """
+    yield error
+    if depth == 0:
+        return
+    exc_info = getattr(error, 'exc_info', None)
+    wrapped = [exc_info[1] if exc_info else None,
+               getattr(error, 'cause', None),
+               getattr(error, 'reason', None),
+               error.__cause__]
+    for inner in wrapped:
+        if isinstance(inner, BaseException) and inner is not error:
+            for cause in _causes(inner, depth - 1):
+                yield cause
+
+def http_status(error):
+    """
+    Returns the HTTP status code behind an error, or None
+    """
+    for cause in _causes(error):
+        code = getattr(cause, 'code', None)
+        if isinstance(code, int) and 100 <= code < 600:
+            return code
+    match = HTTP_ERROR.search(str(error))
+    if match:
+        return int(match.group(1))
+    return None
+
+def classify(error):
+    """
+    Returns TRANSIENT for errors a retry may fix, PERMANENT for content that
+    is definitively unavailable, None if unknown
+    """
+    code = http_status(error)
+    if code in TRANSIENT_CODES:
+        return TRANSIENT
+    if code in PERMANENT_CODES:
+        return PERMANENT
+    if code != None:
+        return None
+
+    for cause in _causes(error):
+        if isinstance(cause, (socket.timeout, ConnectionError,
+                              urllib.error.URLError)):
+            return TRANSIENT
+        if getattr(cause, 'error_type', None) in TRANSIENT_TYPES:
+            return TRANSIENT
+    return None
+
+def backoff(attempt, base=1.0, cap=30.0):
+    """
+    Returns a delay before retry number `attempt` (from 0), exponential with
+    full jitter so workers that failed together don't retry together
+    """
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+class TokenBucket(object):
+    """
+    Allows `rate` requests per second on average and bursts of up to
+    `burst` requests. A rate of 0 disables the limit.
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.waited = 0.0
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Takes a token, blocking until one is available
+        """
+        while True:
+            with self._lock:
+                if not self.rate:
+                    return
+                now = time.monotonic()
+                self.tokens = min(self.burst,
+                                  self.tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+                self.waited += delay
+            time.sleep(delay)
+
+class CircuitBreaker(object):
+    """
+    Stops requests for `cooldown` seconds after `threshold` transient
+    failures in a row. A threshold of 0 disables the breaker.
+
+    Once the cooldown is over a single request is let through as a probe.
+    If it succeeds requests resume, otherwise the breaker opens again.
+    """
+
+    def __init__(self, threshold=5, cooldown=30):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened = None
+        self.probing = False
+        self.trips = 0
+        self._cond = threading.Condition()
+
+    @property
+    def state(self):
+        with self._cond:
+            if self.opened == None:
+                return 'closed'
+            if self.probing or time.monotonic() >= self.opened + self.cooldown:
+                return 'half-open'
+            return 'open'
+
+    def wait(self, timeout=None):
+        """
+        Blocks while the breaker is open, for at most timeout seconds.
+        Returns False if the request may not go through yet.
+        """
+        deadline = None
+        if timeout != None:
+            deadline = time.monotonic() + timeout
+        with self._cond:
+            while self.opened != None:
+                now = time.monotonic()
+                remaining = self.opened + self.cooldown - now
+                if remaining <= 0 and not self.probing:
+                    self.probing = True
+                    return True
+                if deadline != None:
+                    if now >= deadline:
+                        return False
+                    if remaining <= 0 or deadline - now < remaining:
+                        remaining = deadline - now
+                if remaining > 0:
+                    self._cond.wait(remaining)
+                else:
+                    # Wait for the probe's outcome
+                    self._cond.wait()
+            return True
+
+    def success(self):
+        with self._cond:
+            self.failures = 0
+            self.opened = None
+            self.probing = False
+            self._cond.notify_all()
+
+    def failure(self):
+        """
+        Records a transient failure, returns True if the breaker opened
+        """
+        with self._cond:
+            if not self.threshold:
+                return False
+            self.failures += 1
+            if not self.probing and self.failures < self.threshold:
+                return False
+            self.opened = time.monotonic()
+            self.probing = False
+            self.trips += 1
+            self._cond.notify_all()
+            return True
+
+class NegativeCache(object):
+    """
+    Remembers URLs that are definitively unavailable for `ttl` seconds, so
+    they aren't requested again over and over
+    """
+
+    def __init__(self, ttl=600, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Returns the error message stored for key, or None
+        """
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry == None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self.entries[key]
+                return None
+            return entry[1]
+
+    def put(self, key, message):
+        with self._lock:
+            if len(self.entries) >= self.max_entries:
+                # Drop expired entries, or the oldest half if none expired
+                now = time.monotonic()
+                self.entries = {k: v for k, v in self.entries.items()
+                                if v[0] > now}
+                if len(self.entries) >= self.max_entries:
+                    oldest = sorted(self.entries.items(),
+                                    key=lambda item: item[1][0])
+                    self.entries = dict(oldest[len(oldest) // 2:])
+            self.entries[key] = (time.monotonic() + self.ttl, message)
+
+    def remove(self, key):
+        with self._lock:
+            self.entries.pop(key, None)
+
+    def __len__(self):
+        return len(self.entries)
@@ -4,16 +4,112 @@
 Auxilary functions
 """
 
-from datetime import datetime
+import time
+import json
+import base64
+import urllib.parse
+
+SOUNDCLOUD_BASE = 'https://soundcloud.com/'
 
 def format_millis(millis):
     """
-    Formats milliseconds to a mm:ss format
+    Formats milliseconds to a mm:ss format, or h:mm:ss for an hour or longer
+    """
+    minutes, seconds = divmod(max(0, int(millis)) // 1000, 60)
+    if minutes < 60:
+        return "{:02d}:{:02d}".format(minutes, seconds)
+    hours, minutes = divmod(minutes, 60)
+    return "{}:{:02d}:{:02d}".format(hours, minutes, seconds)
+
+def canonical_url(url, base=SOUNDCLOUD_BASE):
+    """
+    Normalizes a SoundCloud URL or path so it can be used as a cache key
+    """
+    # Add base domain if the URL doesn't have it
+    if not url.startswith('https://') and not url.startswith('http://'):
+        url = base + url.lstrip('/')
+
+    # Drop query string, fragment and trailing slashes
+    url = url.split('#', 1)[0].split('?', 1)[0].rstrip('/')
+    scheme, rest = url.split('://', 1)
+    host, _, path = rest.partition('/')
+    if host.lower() in {'m.soundcloud.com', 'www.soundcloud.com'}:
+        host = 'soundcloud.com'
+    return 'https://{}/{}'.format(host.lower(), path)
+
+def expires_soon(info, margin=0):
+    """
+    Returns True if info has no stream URL valid for margin more seconds
+    """
+    if 'url' not in info:
+        return True
+    return info.get('expires', float('inf')) <= time.time() + margin
+
+def url_expiry(url):
     """
-    return datetime.fromtimestamp(millis/1000.0).strftime("%M:%S")
+    Returns the epoch time a signed stream URL expires at, or None if the URL
+    doesn't say
+    """
+    query = urllib.parse.parse_qs(urllib.parse.urlparse(url).query)
+    for name in ('Expires', 'expires'):
+        if name in query:
+            try:
+                return int(query[name][0])
+            except ValueError:
+                pass
+
+    # CloudFront signed URLs carry a policy in URL-safe base64 JSON
+    if 'Policy' in query:
+        policy = query['Policy'][0]
+        policy = policy.replace('-', '+').replace('_', '=').replace('~', '/')
+        try:
+            statements = json.loads(base64.b64decode(policy).decode('utf-8'))
+            times = [statement['Condition']['DateLessThan']['AWS:EpochTime']
+                     for statement in statements['Statement']]
+            return min(int(t) for t in times)
+        except (ValueError, KeyError, TypeError, UnicodeDecodeError):
+            return None
+
+    return None
+
+class PhaseTimer(object):
+    """
+    Measures how long consecutive phases (e.g. of startup) take
+    """
+
+    def __init__(self, start=None):
+        self.start = time.perf_counter() if start == None else start
+        self.last = self.start
+        self.phases = []
+
+    def mark(self, name):
+        """
+        Ends the current phase, naming it
+        """
+        now = time.perf_counter()
+        self.phases.append((name, now - self.last))
+        self.last = now
+
+    def elapsed(self, name=None):
+        """
+        Returns the time from the start until the end of a phase, or until
+        the last mark if no phase is given
+        """
+        total = 0
+        for phase, duration in self.phases:
+            total += duration
+            if phase == name:
+                break
+        return total
 
-def debug(msg):
-    f = open('~/.soundground/debug.log', 'a')
-    f.write(str(msg))
-    f.write("\n")
-    f.close()
+    def report(self):
+        """
+        Returns a table of phase timings in milliseconds
+        """
+        lines = []
+        total = 0
+        for name, duration in self.phases:
+            total += duration
+            lines.append("{:>9.1f} ms {:>9.1f} ms  {}".format(
+                duration * 1000, total * 1000, name))
+        return "\n".join(lines)
@@ -5,9 +5,14 @@ Window manager
 Coordinates in (y, x) to be consistent with curses
 """
 
-from soundground import metadata, utils
+from soundground import metadata, log, utils
+from soundground.items import ListItem
 import curses
 import time
+import threading
+import collections
+
+logger = log.get_logger(__name__)
 
 class Value(object):
     """
@@ -58,6 +63,8 @@ class WindowGroup(object):
 
         # Also refresh extra stuff (e.g. SelectableList)
         for instance in self.extra_draws:
+            if hasattr(instance, 'invalidate'):
+                instance.invalidate()
             instance.draw()
 
         curses.doupdate()
@@ -123,6 +130,10 @@ class RelativeWindow(object):
 class SelectableList(object):
     """
     Implements a scrollable list with selectable items
+
+    Only the visible rows are rendered. The list remembers what every row
+    currently shows on screen, so a redraw only repaints rows whose text or
+    highlight changed, and scrolling shifts the rows already on screen.
     """
     def __init__(self, window):
         self.window = window
@@ -131,55 +142,135 @@ class SelectableList(object):
         self.scrollpos = 0
         self.active = False
 
+        # Called with the list whenever its scroll position changes
+        self.on_scroll = []
+
+        # (text, attr) currently on screen for each row, None if unknown
+        self._rows = []
+        self._drawn_scrollpos = 0
+        self._size = None
+
+    def invalidate(self):
+        """
+        Forces a full repaint on the next draw
+        """
+        self._rows = []
+
+    def _render(self, index, width):
+        """
+        Returns the (text, attr) a list index should be displayed with
+        """
+        if index >= len(self.items):
+            return ('', curses.A_NORMAL)
+
+        # Highlight selected item
+        attr = curses.A_NORMAL
+        if self.active and index == self.selected:
+            attr = curses.A_REVERSE
+
+        return (self.items[index].caption[:width], attr)
+
+    def _scroll(self, height):
+        """
+        Shifts rows already on screen to follow the scroll position
+        """
+        delta = self.scrollpos - self._drawn_scrollpos
+        self._drawn_scrollpos = self.scrollpos
+        if delta == 0:
+            return
+
+        for callback in self.on_scroll:
+            callback(self)
+
+        if not self._rows:
+            return
+
+        if abs(delta) >= height:
+            # Nothing on screen can be reused
+            self._rows = [None] * height
+            return
+
+        self.window.scrollok(True)
+        self.window.scroll(delta)
+        self.window.scrollok(False)
+        if delta > 0:
+            self._rows = self._rows[delta:] + [None] * delta
+        else:
+            self._rows = [None] * -delta + self._rows[:delta]
+
     def draw(self):
         """
-        Redraw list
+        Redraw changed rows of the list
         """
-        self.window.clear()
         height, width = self.window.getmaxyx()
-        for offset in range(height):
-            index = self.scrollpos + offset
-            if index >= len(self.items):
-                # No more items to draw
-                break
-
-            item = self.items[index]
 
-            # Highlight selected item
-            attr = curses.A_NORMAL
-            if self.active and index == self.selected:
-                attr = curses.A_REVERSE
+        # Repaint everything if the window changed size
+        if (height, width) != self._size:
+            self._size = (height, width)
+            self._rows = []
+
+        if not self._rows:
+            self._scroll(height)
+            self.window.erase()
+            self._rows = [None] * height
+            self._drawn_scrollpos = self.scrollpos
+            changed = True
+        else:
+            changed = self.scrollpos != self._drawn_scrollpos
+            self._scroll(height)
 
-            padded = item['caption'].ljust(width)
+        repainted = 0
+        for offset in range(height):
+            row = self._render(self.scrollpos + offset, width)
+            if self._rows[offset] == row:
+                continue
+
+            self._rows[offset] = row
+            changed = True
+            repainted += 1
+            text, attr = row
             try:
-                self.window.addstr(offset, 0, padded, attr)
+                self.window.addstr(offset, 0, text.ljust(width), attr)
             except:
                 pass
-        self.window.refresh()
+
+        if changed:
+            self.window.refresh()
+        logger.debug('list draw: %d of %d rows repainted at %d', repainted,
+                     height, self.scrollpos)
 
     def add(self, caption, selectable=True, value=None):
         """
-        Add an item to the list and draws it
-
-        An item is a map with the following keys:
-        - caption:    the text displayed on the list
-        - selectable: if False, the item will skip selection
-        - value:      a custom value, could be used to specify a command to be
-                      executed when selected
-        - info:       some additional info
+        Add an item to the list and draws it, see ListItem
         """
+        self.items.append(ListItem(caption, selectable, value))
+
+        # Items below the visible area don't need a redraw
+        height, width = self.window.getmaxyx()
+        if len(self.items) - 1 < self.scrollpos + height:
+            self.draw()
 
-        if value == None:
-            value = caption
+    def add_many(self, captions, selectable=True, values=None):
+        """
+        Add several items to the list with a single redraw
+        """
+        captions = list(captions)
+        if values == None:
+            values = captions
 
-        self.items.append({
-            'caption': caption,
-            'selectable': selectable,
-            'value': value,
-            'info': {}
-        })
+        self.items.extend(ListItem(caption, selectable, value)
+                          for caption, value in zip(captions, values))
         self.draw()
 
+    def replace_items(self, captions, selectable=True, values=None):
+        """
+        Replace the contents of the list with a single redraw
+        """
+        self.items.clear()
+        self.selected = 0
+        self.scrollpos = 0
+        self.add_many(captions, selectable, values)
+
     def remove(self, index):
         """
         Remove an item by its index
@@ -206,15 +297,16 @@ class SelectableList(object):
         elif self.selected >= len(self.items):
             self.selected = len(self.items) - 1
 
-        # Skip unselectable items
-        while not self.items[self.selected]['selectable']:
-            if not relative:
+        # Skip unselectable items, turning back at the ends of the list
+        if not self.items[self.selected].selectable:
+            if not relative or not any(item.selectable for item in self.items):
                 return False
-            self.selected += index
-
-            # Prevent overflow
-            if self.selected < 0 or self.selected >= len(self.items):
-                self.selected -= 2 * index
+            step = -1 if index < 0 else 1
+            while not self.items[self.selected].selectable:
+                self.selected += step
+                if self.selected < 0 or self.selected >= len(self.items):
+                    step = -step
+                    self.selected += step
 
         # Update scroll position
         height, width = self.window.getmaxyx()
@@ -226,6 +318,66 @@ class SelectableList(object):
         self.draw()
 
 
+class UpdateQueue(object):
+    """
+    Collects UI changes posted from worker threads and applies them on the
+    event loop thread in batches, at most `fps` times per second
+
+    Without a loop, changes are applied immediately on the posting thread.
+    """
+
+    def __init__(self, loop=None, fps=30):
+        self.loop = loop
+        self.interval = 1.0 / fps
+        self.updates = collections.deque()
+        self.flushes = 0
+
+        self._scheduled = False
+        self._last_flush = 0
+        self._lock = threading.Lock()
+
+    def post(self, callback, *args, target=None):
+        """
+        Queues callback(*args), target is redrawn once the batch is applied
+        """
+        self.updates.append((callback, args, target))
+        if self.loop == None:
+            self.flush()
+            return
+
+        with self._lock:
+            if self._scheduled:
+                return
+            self._scheduled = True
+
+        # Wait until the next frame is due
+        delay = self._last_flush + self.interval - time.monotonic()
+        self.loop.call_later(max(0, delay), self.flush)
+
+    def flush(self):
+        """
+        Applies all queued changes and redraws each affected target once
+        """
+        with self._lock:
+            self._scheduled = False
+            self._last_flush = time.monotonic()
+
+        targets = []
+        for _ in range(len(self.updates)):
+            callback, args, target = self.updates.popleft()
+            # A broken update must not take the rest of the batch, or the
+            # event loop, down with it
+            try:
+                callback(*args)
+            except Exception:
+                logger.exception('UI update %r failed', callback)
+            if target != None and target not in targets:
+                targets.append(target)
+
+        for target in targets:
+            target.draw()
+        self.flushes += 1
+
 class StatusLine(object):
     """
     Manages the bottom status bar text
@@ -234,39 +386,131 @@ class StatusLine(object):
     SYM_PLAY = u"\u25B6"
     SYM_PAUSE = u"\u23F8"
 
-    def __init__(self, window, player):
+    # Seconds a notification stays visible
+    notify_duration = 3
+
+    def __init__(self, window, player, loop=None):
         self.window = window
         self.player = player
+        self.loop = loop
         self.override_text = None
-        self.override_cycles = 0
+        self.override_until = 0
 
         self.prompting = False
         self.prompt_hidden = False
         self.prompt_value = ''
 
-    def draw(self):
+        # Player state, kept up to date by player events
+        self.playing = False
+        self.title = None
+        self.length = 0
+        self.position = 0.0
+        self.volume = 0
+
+        # Text currently on screen
+        self._rendered = None
+
+    def attach(self):
         """
-        Redraw status bar
+        Subscribes to player events and loads the initial player state
         """
-        self.window.erase()
+        import vlc
+
+        # Event type, handler and the event payload field passed to it
+        handlers = (
+            (vlc.EventType.MediaPlayerPlaying, self._on_playing, None),
+            (vlc.EventType.MediaPlayerPaused, self._on_stopped, None),
+            (vlc.EventType.MediaPlayerStopped, self._on_stopped, None),
+            (vlc.EventType.MediaPlayerEndReached, self._on_stopped, None),
+            (vlc.EventType.MediaPlayerPositionChanged, self._on_position, 'new_position'),
+            (vlc.EventType.MediaPlayerLengthChanged, self._on_length, 'new_length'),
+            (vlc.EventType.MediaPlayerAudioVolume, self._on_volume, None),
+        )
+        events = self.player.event_manager()
+        for event_type, handler, field in handlers:
+            events.event_attach(event_type, self._player_event, handler, field)
+
+        self.refresh_state()
+
+    def _player_event(self, event, handler, field):
+        """
+        Receives player events on the VLC thread and hands them to the loop
+        """
+        # Only read the event payload here, the player must not be called
+        # back from inside its own event thread
+        value = getattr(event.u, field) if field != None else None
 
-        # Fetch some parameters
-        playing = self.SYM_PLAY if self.player.is_playing() else self.SYM_PAUSE
-        title = self.player.get_title()
-        t_total = utils.format_millis(self.player.get_length())
-        t_now = utils.format_millis(self.player.get_position() * self.player.get_length())
-        vol = self.player.audio_get_volume()
+        if self.loop != None:
+            self.loop.call_soon_threadsafe(handler, value)
+        else:
+            handler(value)
+
+    def _on_playing(self, value):
+        self.playing = True
+        self.title = self.player.get_title()
+        self.length = self.player.get_length()
+        self.draw()
+
+    def _on_stopped(self, value):
+        self.playing = False
+        self.draw()
+
+    def _on_position(self, value):
+        self.position = value
+        self.draw()
+
+    def _on_length(self, value):
+        self.length = value
+        self.draw()
+
+    def _on_volume(self, value):
+        self.volume = self.player.audio_get_volume()
+        self.draw()
+
+    def refresh_state(self):
+        """
+        Queries the whole player state, e.g. after a command changed it
+        """
+        self.playing = self.player.is_playing()
+        self.title = self.player.get_title()
+        self.length = self.player.get_length()
+        self.position = self.player.get_position()
+        self.volume = self.player.audio_get_volume()
+        self.draw()
+
+    def invalidate(self):
+        """
+        Forces a repaint on the next draw, e.g. after the window was cleared
+        """
+        self._rendered = None
+
+    def render(self):
+        """
+        Returns the status bar text for the current state
+        """
+        # Override status text if present
+        if self.override_text != None and time.monotonic() < self.override_until:
+            return self.override_text
+
+        playing = self.SYM_PLAY if self.playing else self.SYM_PAUSE
+        t_total = utils.format_millis(self.length)
+        t_now = utils.format_millis(self.position * self.length)
 
         # Format params
         text = "[ {} ] {} [{}/{}] | Vol: {}"
-        formatted = text.format(playing, title, t_now, t_total, vol)
+        return text.format(playing, self.title, t_now, t_total, self.volume)
 
-        # Override status text if present
-        if self.override_text != None and self.override_cycles > 0:
-            formatted = self.override_text
-            self.override_cycles -= 1
+    def draw(self):
+        """
+        Redraw status bar if its text changed
+        """
+        formatted = self.render()
+        if formatted == self._rendered:
+            return
+        self._rendered = formatted
 
         # Draw to screen
+        self.window.erase()
         try:
             self.window.addstr(0, 0, formatted)
             self.window.refresh()
@@ -278,14 +522,18 @@ class StatusLine(object):
         Shows text in the status bar until next refresh or manually dismissed
         """
         self.override_text = text
-        self.override_cycles = 30
+        self.override_until = time.monotonic() + self.notify_duration
         self.draw()
 
+        # Restore the regular status once the notification expires
+        if self.loop != None:
+            self.loop.call_later(self.notify_duration, self.draw)
+
     def dismiss(self):
         """
         Dismiss notification text
         """
-        self.override_cycles = 0
+        self.override_until = 0
         self.draw()
 
     def prompt(self, text, hidden=False):
@@ -298,6 +546,7 @@ class StatusLine(object):
         self.prompting = True
         self.prompt_hidden = hidden
 
+        self.invalidate()
         self.window.clear()
         try:
             self.window.addstr(0, 0, text)
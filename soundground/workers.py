@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Worker Pool
+Runs background jobs on a fixed set of long-lived threads
+"""
+
+import time
+import heapq
+import queue
+import itertools
+import threading
+
+class Job(object):
+    """
+    A unit of work submitted to a WorkerPool
+    """
+
+    def __init__(self, func, args, kwargs):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.result = None
+        self.error = None
+        self.cancelled = False
+        self.submitted = time.monotonic()
+        self._done = threading.Event()
+
+    def run(self):
+        """
+        Runs the job, storing its result or exception
+        """
+        try:
+            self.result = self.func(*self.args, **self.kwargs)
+        except Exception as ex:
+            self.error = ex
+        finally:
+            self._done.set()
+
+    def cancel(self):
+        """
+        Marks a job that was taken off the queue before running as done
+        """
+        self.cancelled = True
+        self._done.set()
+
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """
+        Blocks until the job finishes and returns its result, None if it was
+        cancelled
+        """
+        if not self._done.wait(timeout):
+            return None
+        if self.error != None:
+            raise self.error
+        return self.result
+
+class WorkerPool(object):
+    """
+    A fixed-size pool of worker threads fed by a blocking priority queue
+
+    Jobs with a lower priority value run first, jobs with equal priority run
+    in submission order. Priorities of one pool must be comparable with each
+    other, e.g. all numbers or all tuples.
+
+    With `stats`, a FetchStats, the time each job waited in the queue is
+    recorded under the pool's name.
+    """
+
+    def __init__(self, n_workers=4, name='worker', stats=None):
+        self.n_workers = n_workers
+        self.name = name
+        self.stats = stats
+        # Number of workers running a job
+        self.busy = 0
+        self.jobs = queue.PriorityQueue()
+        self.workers = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def start(self):
+        """
+        Spawns the worker threads if they aren't running yet
+        """
+        with self._lock:
+            while len(self.workers) < self.n_workers:
+                thread = threading.Thread(
+                    target=self._work,
+                    name='{}-{}'.format(self.name, len(self.workers)))
+                thread.daemon = True
+                thread.start()
+                self.workers.append(thread)
+
+    def _work(self):
+        """
+        Worker thread body, blocks on the queue until a job arrives
+        """
+        while True:
+            sentinel, priority, seq, job = self.jobs.get()
+            try:
+                if job == None:
+                    # Shutdown sentinel
+                    return
+                if self.stats != None:
+                    self.stats.record_wait(self.name,
+                                           time.monotonic() - job.submitted)
+                with self._lock:
+                    self.busy += 1
+                try:
+                    job.run()
+                finally:
+                    with self._lock:
+                        self.busy -= 1
+            finally:
+                self.jobs.task_done()
+
+    def submit(self, func, *args, priority=0, **kwargs):
+        """
+        Queues a function call and returns its Job
+        """
+        self.start()
+        job = Job(func, args, kwargs)
+        self.jobs.put((False, priority, next(self._seq), job))
+        return job
+
+    def cancel(self, predicate=None):
+        """
+        Takes the queued jobs for which predicate(job) is true off the queue,
+        or all queued jobs without a predicate. Jobs already running aren't
+        affected. Returns the number of jobs cancelled.
+        """
+        jobs = self.jobs
+        cancelled = []
+        with jobs.mutex:
+            kept = []
+            for entry in jobs.queue:
+                job = entry[3]
+                if job != None and (predicate == None or predicate(job)):
+                    cancelled.append(job)
+                else:
+                    kept.append(entry)
+            if cancelled:
+                heapq.heapify(kept)
+                jobs.queue[:] = kept
+                # Keep join working, cancelled jobs count as done
+                jobs.unfinished_tasks -= len(cancelled)
+                if jobs.unfinished_tasks == 0:
+                    jobs.all_tasks_done.notify_all()
+
+        for job in cancelled:
+            job.cancel()
+        return len(cancelled)
+
+    def join(self):
+        """
+        Blocks until every queued job has finished
+        """
+        self.jobs.join()
+
+    def shutdown(self, wait=True):
+        """
+        Stops all workers once the queued jobs are done
+        """
+        with self._lock:
+            workers = self.workers
+            self.workers = []
+        for _ in workers:
+            # Sentinels sort after every real job
+            self.jobs.put((True, 0, next(self._seq), None))
+        if wait:
+            for thread in workers:
+                thread.join()
+
+class SingleFlight(object):
+    """
+    Coalesces concurrent calls of an operation with the same key: the first
+    caller runs the function, callers arriving while it runs wait and get the
+    same result or exception
+
+    With `stats`, a FetchStats, calls that joined another are counted by
+    operation.
+    """
+
+    def __init__(self, stats=None):
+        self.stats = stats
+        self.calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, operation, key, func, *args, **kwargs):
+        key = (operation, key)
+        with self._lock:
+            call = self.calls.get(key)
+            leader = call == None
+            if leader:
+                call = Job(func, args, kwargs)
+                self.calls[key] = call
+
+        if not leader and self.stats != None:
+            self.stats.record_coalesced(operation)
+
+        if leader:
+            try:
+                call.run()
+            finally:
+                with self._lock:
+                    del self.calls[key]
+        return call.wait()
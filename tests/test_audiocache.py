@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+
+from soundground.audiocache import AudioCache
+from soundground.items import ListItem
+from soundground.playman import PlaylistManager
+
+
+def make_source(tmpdir, name, size):
+    source = tmpdir.join(name)
+    source.write_binary(b'x' * size)
+    return 'file://' + str(source)
+
+
+class TestAudioCache(object):
+    def test_download_and_hit(self, tmpdir):
+        cache = AudioCache(str(tmpdir.join('audio')))
+        url = make_source(tmpdir, 'track.mp3', 1000)
+        assert cache.get('track') is None
+        path = cache.download('track', url)
+        assert cache.get('track') == path
+        stats = cache.stats()
+        assert stats['hits'] == 1
+        assert stats['misses'] == 1
+        assert stats['bytes_saved'] == 1000
+        assert stats['bytes_downloaded'] == 1000
+
+    def test_lru_eviction(self, tmpdir):
+        cache = AudioCache(str(tmpdir.join('audio')), max_bytes=2500)
+        for name in ('a', 'b'):
+            cache.download(name, make_source(tmpdir, name, 1000))
+            time.sleep(0.01)
+        # Use 'a' so 'b' is evicted first
+        cache.get('a')
+        cache.download('c', make_source(tmpdir, 'c', 1000))
+        assert cache.contains('a')
+        assert not cache.contains('b')
+        assert cache.contains('c')
+
+    def test_no_partial_files_left(self, tmpdir):
+        cache = AudioCache(str(tmpdir.join('audio')))
+        cache.download('track', make_source(tmpdir, 'track.mp3', 10))
+        assert [name for name in os.listdir(cache.path)
+                if name.endswith('.part')] == []
+
+
+class FakeCloud(object):
+    def __init__(self, tmpdir):
+        self.tmpdir = tmpdir
+
+    def stream_info(self, url, margin=0, wait=True):
+        return {'url': make_source(self.tmpdir, url, 100)}
+
+
+class FakePlayer(object):
+    def __init__(self):
+        self.on_advance = []
+        self.mrl = None
+
+    def play_url(self, url):
+        self.mrl = url
+
+    def preload(self, url):
+        pass
+
+
+class TestReadAhead(object):
+    def test_plays_upcoming_track_from_disk(self, tmpdir):
+        cache = AudioCache(str(tmpdir.join('audio')))
+        manager = PlaylistManager(FakeCloud(tmpdir), FakePlayer(), 1, cache)
+        manager.load([ListItem('first'), ListItem('second')])
+        manager.play(0)
+        manager.pool.join()
+        manager.downloads.join()
+
+        # Only the upcoming track was downloaded
+        assert not cache.contains('https://soundcloud.com/first')
+        assert cache.contains('https://soundcloud.com/second')
+        manager.next()
+        assert manager.player.mrl.startswith(cache.path)
+
+    def test_resolved_rows_read_ahead(self, tmpdir):
+        cache = AudioCache(str(tmpdir.join('audio')))
+        cloud = FakeCloud(tmpdir)
+        manager = PlaylistManager(cloud, FakePlayer(), 2, cache)
+        # Rows loaded by CloudManager already carry their stream URL
+        items = [ListItem(name, info={'url': make_source(tmpdir, name, 100),
+                                      'expires': time.time() + 3600})
+                 for name in ('first', 'second', 'third')]
+        manager.load(items)
+        manager.prefetch()
+        manager.downloads.join()
+
+        assert cache.contains('https://soundcloud.com/second')
+        assert cache.contains('https://soundcloud.com/third')
+        assert cache.stats()['bytes_downloaded'] == 200
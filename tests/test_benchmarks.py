@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+import json
+import curses
+
+from benchmarks import bench_fetch, bench_render
+
+
+class TestFetchBenchmark(object):
+    def test_run(self):
+        result = bench_fetch.run_benchmark(100, latency=0, threads=2)
+        assert result['size'] == 100
+        assert result['extractions'] == 100
+        assert result['errors'] == 0
+        assert result['throughput'] > 0
+        assert result['p50_ms'] <= result['p99_ms'] <= result['max_ms']
+        assert result['peak_bytes'] > 0
+
+    def test_errors(self):
+        result = bench_fetch.run_benchmark(50, latency=0, error_rate=1.0,
+                                           trace_memory=False)
+        assert result['errors'] == 50
+        assert result['peak_bytes'] is None
+
+    def test_results_compared_with_previous_version(self, tmpdir, capsys):
+        output = str(tmpdir.join('fetch.json'))
+        argv = ['bench_fetch', '--sizes', '20', '--latency', '0',
+                '--output', output]
+        assert bench_fetch.main(argv + ['--label', '0.1']) == 0
+        assert bench_fetch.main(argv + ['--label', '0.2']) == 0
+        with open(output) as results_file:
+            assert set(json.load(results_file)) == {'0.1', '0.2'}
+        assert 'Compared to the previous version' in capsys.readouterr().out
+
+
+class TestRenderBenchmark(object):
+    def test_populate_draws_one_screen(self):
+        result = bench_render.bench_populate(1000)
+        assert result['writes'] == bench_render.LIST_HEIGHT
+
+    def test_scroll_repaints_two_rows_per_step(self):
+        result = bench_render.bench_scroll(200)
+        assert result['writes'] <= 2 * result['operations']
+        assert result['scrolls'] <= result['operations']
+
+    def test_hidden_row_updates_are_free(self):
+        result = bench_render.bench_row_updates(1000, 100)
+        assert result['writes'] < 10
+
+    def test_resize_restores_curses(self):
+        result = bench_render.bench_resize(100, 4)
+        assert result['updates'] == 5
+        screen = getattr(curses.newwin, '__self__', None)
+        assert not isinstance(screen, bench_render.HeadlessScreen)
+
+    def test_status_draws_once_per_second(self):
+        result = bench_render.bench_status(400)
+        assert result['writes'] == 99
+
+    def test_main(self, tmpdir, capsys):
+        output = str(tmpdir.join('render.json'))
+        argv = ['bench_render', '--rows', '100', '--resizes', '2',
+                '--updates', '10', '--output', output]
+        assert bench_render.main(argv) == 0
+        assert 'scroll' in capsys.readouterr().out
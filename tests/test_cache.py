@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+import time
+
+from soundground import utils
+from soundground.cache import MetadataCache
+
+
+class TestMetadataCache(object):
+    def test_hit_and_miss(self, tmpdir):
+        cache = MetadataCache(str(tmpdir.join('cache.db')))
+        assert cache.get('https://soundcloud.com/a/b') is None
+        cache.put('https://soundcloud.com/a/b', {'title': 'b'})
+        assert cache.get('https://soundcloud.com/a/b') == {'title': 'b'}
+        stats = cache.stats()
+        assert stats['hits'] == 1
+        assert stats['misses'] == 1
+
+    def test_ttl(self, tmpdir):
+        cache = MetadataCache(str(tmpdir.join('cache.db')), ttl=0.01)
+        cache.put('key', {'title': 'x'})
+        time.sleep(0.02)
+        assert cache.get('key') is None
+
+    def test_lru_eviction(self, tmpdir):
+        cache = MetadataCache(str(tmpdir.join('cache.db')), max_entries=2)
+        cache.evict_interval = 1
+        cache.put('a', 1)
+        cache.put('b', 2)
+        # Touch 'a' so 'b' becomes the least recently used entry
+        time.sleep(0.01)
+        cache.get('a')
+        cache.put('c', 3)
+        assert len(cache) == 2
+        assert cache.get('b') is None
+        assert cache.get('a') == 1
+
+    def test_shared_between_instances(self, tmpdir):
+        path = str(tmpdir.join('cache.db'))
+        MetadataCache(path).put('key', {'title': 'x'})
+        assert MetadataCache(path).get('key') == {'title': 'x'}
+
+
+class TestCanonicalUrl(object):
+    def test_relative(self):
+        assert (utils.canonical_url('artist/track') ==
+                'https://soundcloud.com/artist/track')
+
+    def test_normalizes(self):
+        url = 'https://m.soundcloud.com/artist/track/?in=foo#t=10'
+        assert utils.canonical_url(url) == 'https://soundcloud.com/artist/track'
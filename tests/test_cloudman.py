@@ -0,0 +1,510 @@
+# -*- coding: utf-8 -*-
+import json
+import time
+import base64
+import threading
+
+from pytest import raises
+
+from soundground import credman, utils
+from soundground.cache import MetadataCache
+from soundground.cloudman import (CloudManager, ProcessExtractor,
+                                  ExtractionError, create_ydl)
+from soundground.items import ListItem
+from soundground.winman import SelectableList
+
+from benchmarks.fakes import FakeExtractor
+from test_winman import FakeWindow
+
+
+class FakeYoutubeDL(object):
+    created = 0
+    # Lazily generated list entries returned for process=False
+    entries = None
+
+    def __init__(self):
+        FakeYoutubeDL.created += 1
+        self.owner = threading.current_thread()
+        self.calls = 0
+
+    def extract_info(self, url, download=True, process=True):
+        # Each instance must only ever be used by the thread that created it
+        assert threading.current_thread() is self.owner
+        if not process:
+            return {'entries': FakeYoutubeDL.entries}
+        self.calls += 1
+        return {'uploader': 'someone', 'title': url.split('/')[-1],
+                'webpage_url': url, 'url': url + '/stream',
+                'formats': [{'url': url + '/stream'}] * 10,
+                'http_headers': {'User-Agent': 'test'}}
+
+
+class SlowYoutubeDL(object):
+    def extract_info(self, url, download=True, process=True):
+        time.sleep(1.5)
+        return {'title': url}
+
+
+class FailingYoutubeDL(object):
+    def extract_info(self, url, download=True, process=True):
+        raise TimeoutError('timed out')
+
+
+class FlakyYoutubeDL(FakeYoutubeDL):
+    # Errors raised by the next calls, e.g. [TimeoutError('timed out')]
+    errors = []
+
+    def extract_info(self, url, download=True, process=True):
+        if FlakyYoutubeDL.errors:
+            raise FlakyYoutubeDL.errors.pop(0)
+        return super(FlakyYoutubeDL, self).extract_info(url, download, process)
+
+
+class GatedYoutubeDL(FakeYoutubeDL):
+    # Extractions block until release is set
+    started = threading.Event()
+    release = threading.Event()
+    requests = []
+
+    def extract_info(self, url, download=True, process=True):
+        GatedYoutubeDL.requests.append(url)
+        GatedYoutubeDL.started.set()
+        GatedYoutubeDL.release.wait(5)
+        return super(GatedYoutubeDL, self).extract_info(url, download, process)
+
+
+class HTTPError(Exception):
+    def __init__(self, code):
+        super(HTTPError, self).__init__('HTTP Error {}'.format(code))
+        self.code = code
+
+
+class FakeList(object):
+    def __init__(self, urls):
+        self.items = [ListItem(url) for url in urls]
+
+    def draw(self):
+        pass
+
+    def add(self, caption, selectable=True):
+        self.items.append(ListItem(caption, selectable))
+
+    def add_many(self, captions):
+        self.items.extend(ListItem(caption) for caption in captions)
+
+    def replace_items(self, captions):
+        self.items = [ListItem(caption) for caption in captions]
+
+
+def make_cloudman(tmpdir, urls):
+    return CloudManager(credman.Credentials(), FakeList(urls),
+                        MetadataCache(str(tmpdir.join('cache.db'))),
+                        ydl_factory=FakeYoutubeDL, throttled=False)
+
+
+class TestCloudManager(object):
+    def test_process_playlist(self, tmpdir):
+        urls = ['artist/track{}'.format(i) for i in range(20)]
+        cm = make_cloudman(tmpdir, urls)
+        cm.process_playlist()
+        captions = [item.caption for item in cm.playlist.items]
+        assert captions == ['someone - track{}'.format(i) for i in range(20)]
+
+    def test_ydl_per_worker(self, tmpdir):
+        cm = make_cloudman(tmpdir, ['artist/track{}'.format(i) for i in range(40)])
+        cm.process_playlist()
+        assert 1 <= len(cm.ydl_pool.instances) <= cm.n_threads
+        assert sum(ydl.calls for ydl in cm.ydl_pool.instances) == 40
+
+    def test_cached(self, tmpdir):
+        cm = make_cloudman(tmpdir, ['artist/track'])
+        cm.process_playlist()
+        cm.process_playlist()
+        assert sum(ydl.calls for ydl in cm.ydl_pool.instances) == 1
+        assert cm.cache.stats()['hits'] == 1
+
+    def test_slim_info(self, tmpdir):
+        cm = make_cloudman(tmpdir, ['artist/track'])
+        cm.process_playlist()
+        info = cm.playlist.items[0].info
+        assert set(info) == {'uploader', 'title', 'webpage_url', 'url', 'expires'}
+        assert cm.raw_info('artist/track') is None
+
+    def test_keep_raw(self, tmpdir):
+        cm = make_cloudman(tmpdir, ['artist/track'])
+        cm.keep_raw = True
+        cm.process_playlist()
+        assert 'formats' in cm.raw_info('artist/track')
+        assert 'formats' not in cm.playlist.items[0].info
+
+    def test_stats(self, tmpdir):
+        cm = make_cloudman(tmpdir, ['artist/track{}'.format(i) for i in range(5)])
+        cm.process_playlist()
+        cm.process_url('artist/track0', fresh=True)
+        snapshot = cm.stats_snapshot()
+        process = snapshot['operations']['process_url']
+        assert process['count'] == 6
+        assert process['bytes'] > 0
+        assert process['errors'] == {}
+        assert snapshot['queue_wait']['fetch']['count'] == 5
+        assert snapshot['workers']['fetch']['busy'] == 0
+        assert snapshot['cache']['misses'] == 5
+
+    def test_process_mode(self, tmpdir):
+        urls = ['artist/track{}'.format(i) for i in range(10)]
+        cm = CloudManager(credman.Credentials(), FakeList(urls),
+                          MetadataCache(str(tmpdir.join('cache.db'))),
+                          ydl_factory=FakeYoutubeDL, processes=2,
+                          throttled=False)
+        cm.keep_raw = True
+        try:
+            cm.process_playlist()
+        finally:
+            cm.extractor.shutdown()
+        captions = [item.caption for item in cm.playlist.items]
+        assert captions == ['someone - track{}'.format(i) for i in range(10)]
+        assert 'expires' in cm.playlist.items[0].info
+        assert 'formats' in cm.raw_info('artist/track0')
+        # Extraction happened in the worker processes only
+        assert cm.ydl_pool.instances == []
+        assert cm.stats_snapshot()['operations']['process_url']['bytes'] > 0
+
+    def test_process_mode_error(self, tmpdir):
+        cm = CloudManager(credman.Credentials(), FakeList([]),
+                          MetadataCache(str(tmpdir.join('cache.db'))),
+                          ydl_factory=FailingYoutubeDL, processes=1)
+        cm.limiter.rate = 0
+        cm.retry_base = 0
+        try:
+            assert cm.process_url('artist/track') == {'error': 'timed out'}
+        finally:
+            cm.extractor.shutdown()
+        # The timeout is retried, every attempt is counted
+        errors = cm.stats_snapshot()['operations']['process_url']['errors']
+        assert errors == {'TimeoutError': cm.max_retries + 1}
+
+    def test_new_list_replaces_queue(self, tmpdir):
+        cm = make_cloudman(tmpdir, ['old/track{}'.format(i) for i in range(20)])
+        cm.pool.n_workers = 1
+        release = threading.Event()
+        cm.pool.submit(release.wait, priority=(-1, 0))
+        cm.async_process_playlist()
+
+        # Another list is shown before any of the old one was fetched
+        cm.playlist = FakeList(['new/track{}'.format(i) for i in range(20)])
+        cm.async_process_playlist()
+        fetched = []
+        process_url = cm.process_url
+        cm.process_url = lambda url: fetched.append(url) or process_url(url)
+        release.set()
+        cm.pool.join()
+
+        assert fetched == ['new/track{}'.format(i) for i in range(20)]
+        captions = [item.caption for item in cm.playlist.items]
+        assert captions == ['someone - track{}'.format(i) for i in range(20)]
+
+    def test_switch_lists(self, tmpdir):
+        extractor = FakeExtractor(latency=0.005, list_size=40)
+        cm = CloudManager(credman.Credentials(), FakeList([]),
+                          MetadataCache(str(tmpdir.join('cache.db'))),
+                          ydl_factory=extractor, throttled=False)
+        cm.page_size = 10
+        cm.load_list('user/likes')
+        cm.load_list('user/sets').wait(5)
+        cm.pool.join()
+
+        # Every row holds info on its own track only
+        items = cm.playlist.items
+        assert [item.value for item in items] == \
+            ['https://soundcloud.com/user/sets/track{}'.format(i)
+             for i in range(40)]
+        assert all(item.info['webpage_url'] == item.value for item in items)
+
+    def test_cancel_stops_reading(self, tmpdir):
+        cm = make_cloudman(tmpdir, ['Loading'])
+        cm.page_size = 10
+        read = []
+        first_page = threading.Event()
+        proceed = threading.Event()
+
+        def entries():
+            for i in range(100):
+                if i == 10:
+                    first_page.set()
+                    proceed.wait(5)
+                read.append(i)
+                yield {'url': 'artist/track{}'.format(i)}
+
+        FakeYoutubeDL.entries = entries()
+        job = cm.load_list('artist/likes')
+        assert first_page.wait(5)
+        cm.cancel()
+        cm.playlist.replace_items(['Please log in'])
+        proceed.set()
+        job.wait(5)
+        cm.pool.join()
+
+        # Reading stopped right away and nothing was written to the new rows
+        assert len(read) == 11
+        assert [item.caption for item in cm.playlist.items] == ['Please log in']
+        assert cm.pool.jobs.qsize() == 0
+
+    def test_stale_updates_dropped(self, tmpdir):
+        urls = ['artist/track{}'.format(i) for i in range(40)]
+        cm = make_cloudman(tmpdir, urls)
+        cm.playlist.replace_items(['other/a', 'other/b', 'other/c'])
+        # Updates of the previous list arriving late
+        generation = cm.generation
+        cm._post_item(generation, 30, 'artist/track30', 'someone - track30', {})
+        cm._post_item(generation, 1, 'artist/track1', 'someone - track1',
+                      {'url': 'x'})
+        assert [item.caption for item in cm.playlist.items] == \
+            ['other/a', 'other/b', 'other/c']
+        assert cm.playlist.items[1].info is None
+
+    def test_process_mode_timeout(self):
+        extractor = ProcessExtractor(SlowYoutubeDL, 1, timeout=0.3)
+        try:
+            start = time.monotonic()
+            with raises(ExtractionError) as error:
+                extractor.extract('artist/track')
+            # Gave up without waiting for the extraction
+            assert time.monotonic() - start < 1.0
+        finally:
+            extractor.shutdown()
+        assert error.value.error_type == 'TimeoutError'
+
+    def test_socket_timeout(self):
+        assert create_ydl('', '', 5).params['socket_timeout'] == 5
+
+    def test_load_list_streams_pages(self, tmpdir):
+        cm = make_cloudman(tmpdir, ['Loading'])
+        cm.page_size = 10
+        first_page = threading.Event()
+        proceed = threading.Event()
+
+        def entries():
+            for i in range(25):
+                if i == 10:
+                    first_page.set()
+                    proceed.wait()
+                yield {'url': 'artist/track{}'.format(i)}
+
+        FakeYoutubeDL.entries = entries()
+        cm.load_list('artist/likes')
+
+        # The first page shows up while the list is still being read
+        assert first_page.wait(5)
+        cm.pool.join()
+        assert len(cm.playlist.items) == 10
+        assert cm.playlist.items[9].caption == 'someone - track9'
+
+        proceed.set()
+        cm.list_pool.join()
+        cm.pool.join()
+        captions = [item.caption for item in cm.playlist.items]
+        assert captions == ['someone - track{}'.format(i) for i in range(25)]
+
+    def test_visible_rows_first(self, tmpdir):
+        window = FakeWindow(10, 40)
+        playlist = SelectableList(window)
+        playlist.add_many(['artist/track{}'.format(i) for i in range(200)])
+        cm = CloudManager(credman.Credentials(), playlist,
+                          MetadataCache(str(tmpdir.join('cache.db'))),
+                          ydl_factory=FakeYoutubeDL, throttled=False)
+        cm.pool.n_workers = 1
+
+        # Hold the only worker while the list is queued and scrolled
+        release = threading.Event()
+        cm.pool.submit(release.wait, priority=(-1, 0))
+        cm.async_process_playlist()
+        playlist.select(150, False)
+
+        order = []
+        process_url = cm.process_url
+        cm.process_url = lambda url: order.append(url) or process_url(url)
+        release.set()
+        cm.pool.join()
+
+        assert len(order) == 200
+        first = set(order[:10])
+        assert first == {'artist/track{}'.format(i) for i in range(141, 151)}
+        # The selected row comes first, then the rows around it
+        assert order[0] == 'artist/track150'
+        nearby = set(order[10:30])
+        assert nearby == {'artist/track{}'.format(i)
+                          for i in list(range(131, 141)) + list(range(151, 161))}
+
+    def test_expired_stream_url(self, tmpdir):
+        cm = make_cloudman(tmpdir, [])
+        info = cm.stream_info('artist/track')
+        assert info['expires'] > time.time() + cm.expiry_margin
+
+        # A cached but expired stream URL is re-resolved before use
+        info['expires'] = time.time()
+        cm.cache.put(utils.canonical_url('artist/track'), info)
+        calls = sum(ydl.calls for ydl in cm.ydl_pool.instances)
+        assert cm.stream_info('artist/track')['expires'] > time.time()
+        assert sum(ydl.calls for ydl in cm.ydl_pool.instances) == calls + 1
+
+
+def make_flaky_cloudman(tmpdir, errors):
+    FlakyYoutubeDL.errors = list(errors)
+    cm = CloudManager(credman.Credentials(), FakeList([]),
+                      MetadataCache(str(tmpdir.join('cache.db'))),
+                      ydl_factory=FlakyYoutubeDL)
+    cm.limiter.rate = 0
+    cm.retry_base = 0
+    return cm
+
+
+class TestThrottling(object):
+    def test_retries_transient_errors(self, tmpdir):
+        cm = make_flaky_cloudman(tmpdir, [TimeoutError('timed out'),
+                                          HTTPError(503)])
+        assert cm.process_url('artist/track')['title'] == 'track'
+        operation = cm.stats_snapshot()['operations']['process_url']
+        assert operation['count'] == 3
+        assert operation['errors'] == {'TimeoutError': 1, 'HTTPError': 1}
+        assert cm.breaker.failures == 0
+
+    def test_gives_up(self, tmpdir):
+        cm = make_flaky_cloudman(tmpdir, [TimeoutError('timed out')] * 10)
+        assert cm.process_url('artist/track') == {'error': 'timed out'}
+        assert len(FlakyYoutubeDL.errors) == 10 - (cm.max_retries + 1)
+
+    def test_no_retry_without_wait(self, tmpdir):
+        cm = make_flaky_cloudman(tmpdir, [TimeoutError('timed out')] * 2)
+        assert cm.stream_info('artist/track', wait=False) == {'error': 'timed out'}
+        assert len(FlakyYoutubeDL.errors) == 1
+
+    def test_permanent_errors_cached(self, tmpdir):
+        cm = make_flaky_cloudman(tmpdir, [HTTPError(404)])
+        assert cm.process_url('artist/gone') == {'error': 'HTTP Error 404'}
+        # Not retried, and not requested again
+        assert cm.process_url('artist/gone') == {'error': 'HTTP Error 404'}
+        assert cm.stats_snapshot()['operations']['process_url']['count'] == 1
+        assert cm.process_url('artist/gone', fresh=True)['title'] == 'gone'
+        assert cm.process_url('artist/gone')['title'] == 'gone'
+
+    def test_breaker_recovers(self, tmpdir):
+        cm = make_flaky_cloudman(tmpdir, [TimeoutError('timed out')] * 2)
+        cm.max_retries = 0
+        cm.breaker.threshold = 2
+        cm.breaker.cooldown = 0.05
+        assert 'error' in cm.process_url('artist/track0')
+        assert 'error' in cm.process_url('artist/track1')
+        assert cm.breaker.state == 'open'
+
+        # Fails fast on the UI thread while open
+        assert 'error' in cm.process_url('artist/track2', wait=False)
+
+        # The probe succeeds and requests flow again
+        assert cm.process_url('artist/track2')['title'] == 'track2'
+        assert cm.breaker.state == 'closed'
+        assert cm.process_url('artist/track3')['title'] == 'track3'
+
+
+def start_callers(func, args):
+    results = [None] * len(args)
+
+    def call(index):
+        results[index] = func(args[index])
+
+    threads = [threading.Thread(target=call, args=(index,))
+               for index in range(len(args))]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+
+def wait_for_callers(cm, operation, n):
+    deadline = time.monotonic() + 5
+    while (cm.stats.operations[operation].coalesced < n and
+           time.monotonic() < deadline):
+        time.sleep(0.01)
+
+
+class TestCoalescing(object):
+    def make_cloudman(self, tmpdir):
+        GatedYoutubeDL.started.clear()
+        GatedYoutubeDL.release.clear()
+        GatedYoutubeDL.requests = []
+        return CloudManager(credman.Credentials(), FakeList([]),
+                            MetadataCache(str(tmpdir.join('cache.db'))),
+                            ydl_factory=GatedYoutubeDL, throttled=False)
+
+    def test_process_url(self, tmpdir):
+        cm = self.make_cloudman(tmpdir)
+        # Spellings of the same track
+        urls = ['artist/track', 'https://soundcloud.com/artist/track',
+                'https://m.soundcloud.com/artist/track/',
+                'artist/track?in=artist/sets/set', 'artist/track']
+        threads, results = start_callers(cm.process_url, urls)
+        assert GatedYoutubeDL.started.wait(5)
+        wait_for_callers(cm, 'process_url', len(urls) - 1)
+        GatedYoutubeDL.release.set()
+        for thread in threads:
+            thread.join(5)
+
+        assert len(GatedYoutubeDL.requests) == 1
+        assert all(result['title'] == 'track' for result in results)
+        operation = cm.stats_snapshot()['operations']['process_url']
+        assert operation['count'] == 1
+        assert operation['coalesced'] == len(urls) - 1
+
+    def test_fetch_url(self, tmpdir):
+        cm = self.make_cloudman(tmpdir)
+        FakeYoutubeDL.entries = ({'url': 'artist/track{}'.format(i)}
+                                 for i in range(30))
+        threads, results = start_callers(cm.fetch_url,
+                                         ['artist/likes'] * 3)
+        assert GatedYoutubeDL.started.wait(5)
+        wait_for_callers(cm, 'fetch_url', 2)
+        GatedYoutubeDL.release.set()
+        for thread in threads:
+            thread.join(5)
+
+        assert len(GatedYoutubeDL.requests) == 1
+        # Every caller reads all the entries
+        for result in results:
+            urls = [entry['url'] for entry in result['entries']]
+            assert urls == ['artist/track{}'.format(i) for i in range(30)]
+
+    def test_fetch_url_while_reading(self, tmpdir):
+        cm = self.make_cloudman(tmpdir)
+        GatedYoutubeDL.release.set()
+        FakeYoutubeDL.entries = ({'url': 'artist/track{}'.format(i)}
+                                 for i in range(30))
+        first = iter(cm.fetch_url('artist/likes')['entries'])
+        assert [next(first)['url'] for _ in range(5)] == \
+            ['artist/track{}'.format(i) for i in range(5)]
+
+        # Joins the list still being read and starts from its beginning
+        second = cm.fetch_url('https://soundcloud.com/artist/likes/')
+        assert len(second['entries'].entries) == 5
+        assert len(list(second['entries'])) == 30
+        assert len(list(first)) == 25
+        assert len(GatedYoutubeDL.requests) == 1
+
+        # Read to the end, the list is requested again next time
+        FakeYoutubeDL.entries = iter([])
+        assert list(cm.fetch_url('artist/likes')['entries']) == []
+        assert len(GatedYoutubeDL.requests) == 2
+
+
+class TestUrlExpiry(object):
+    def test_expires_param(self):
+        assert utils.url_expiry('https://cf-media.sndcdn.com/a.mp3?expires=1500') == 1500
+
+    def test_cloudfront_policy(self):
+        policy = json.dumps({'Statement': [{'Condition': {
+            'DateLessThan': {'AWS:EpochTime': 1700000000}}}]})
+        encoded = base64.b64encode(policy.encode('utf-8')).decode('ascii')
+        encoded = encoded.replace('+', '-').replace('=', '_').replace('/', '~')
+        url = 'https://cf-media.sndcdn.com/a.mp3?Policy={}&Signature=x'.format(encoded)
+        assert utils.url_expiry(url) == 1700000000
+
+    def test_unknown(self):
+        assert utils.url_expiry('https://cf-media.sndcdn.com/a.mp3') is None
+        assert utils.url_expiry('https://cf-media.sndcdn.com/a.mp3?Policy=bad') is None
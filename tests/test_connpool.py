@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+import time
+import socket
+import threading
+import urllib.error
+import urllib.request
+import http.server
+
+import pytest
+
+from soundground import connpool
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    connections = 0
+
+    def setup(self):
+        Handler.connections += 1
+        http.server.BaseHTTPRequestHandler.setup(self)
+
+    def do_GET(self):
+        body = self.path.encode('utf-8')
+        self.send_response(503 if self.path.startswith('/error') else 200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    Handler.connections = 0
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield 'http://localhost:{}'.format(httpd.server_address[1])
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def make_opener(pool):
+    return pool.install(urllib.request.build_opener())
+
+
+class TestConnectionPool(object):
+    def test_reuses_connection(self, server):
+        pool = connpool.ConnectionPool()
+        opener = make_opener(pool)
+        for i in range(10):
+            with opener.open('{}/track{}'.format(server, i)) as response:
+                assert response.read() == '/track{}'.format(i).encode('utf-8')
+        assert Handler.connections == 1
+        assert pool.stats()['connections_reused'] == 9
+        assert pool.dns.misses == 1
+        pool.close()
+
+    def test_host_limit(self, server):
+        pool = connpool.ConnectionPool(max_per_host=1)
+        opener = make_opener(pool)
+        first = opener.open(server + '/first')
+        results = []
+        thread = threading.Thread(
+            target=lambda: results.append(opener.open(server + '/second').read()))
+        thread.start()
+
+        # The only connection is lent out until the first body is read
+        thread.join(0.2)
+        assert results == []
+        assert first.read() == b'/first'
+        thread.join(5)
+        assert results == [b'/second']
+        assert Handler.connections == 1
+        pool.close()
+
+    def test_wait_timeout(self, server):
+        pool = connpool.ConnectionPool(max_per_host=1, wait_timeout=0.1)
+        opener = make_opener(pool)
+        first = opener.open(server + '/first')
+
+        # Doesn't wait for the lent out connection, uses one of its own
+        start = time.monotonic()
+        assert opener.open(server + '/second').read() == b'/second'
+        assert time.monotonic() - start < 1
+        assert first.read() == b'/first'
+        assert Handler.connections == 2
+        assert pool.stats()['connections_overflow'] == 1
+        # Only the pooled connection is kept
+        assert len(pool.idle[('http', server[7:])]) == 1
+        pool.close()
+
+    def test_error_responses_release(self, server):
+        pool = connpool.ConnectionPool(max_per_host=1, wait_timeout=None)
+        opener = make_opener(pool)
+        errors = []
+        for i in range(3):
+            with pytest.raises(urllib.error.HTTPError) as error:
+                opener.open('{}/error{}'.format(server, i))
+            # Kept around unread
+            errors.append(error.value)
+        assert [error.code for error in errors] == [503] * 3
+        assert errors[2].read() == b'/error2'
+        assert opener.open(server + '/ok').read() == b'/ok'
+        assert Handler.connections == 1
+        pool.close()
+
+    def test_closed_early(self, server):
+        pool = connpool.ConnectionPool()
+        opener = make_opener(pool)
+        opener.open(server + '/unread').close()
+        assert pool.idle.get(('http', server[7:])) in (None, [])
+        assert opener.open(server + '/b').read() == b'/b'
+        assert Handler.connections == 2
+        pool.close()
+
+    def test_reconnects_after_server_closed(self, server):
+        pool = connpool.ConnectionPool()
+        opener = make_opener(pool)
+        assert opener.open(server + '/a').read() == b'/a'
+        # Drop the idle connection behind the pool's back
+        conn, last_used = pool.idle[('http', server[7:])][0]
+        conn.sock.shutdown(socket.SHUT_RDWR)
+        assert opener.open(server + '/b').read() == b'/b'
+
+    def test_idle_timeout(self, server):
+        pool = connpool.ConnectionPool(idle_timeout=0)
+        opener = make_opener(pool)
+        opener.open(server + '/a').read()
+        opener.open(server + '/b').read()
+        assert Handler.connections == 2
+
+
+class TestDNSCache(object):
+    def test_cached(self):
+        dns = connpool.DNSCache()
+        first = dns.resolve('localhost', 80)
+        assert dns.resolve('localhost', 80) == first
+        assert (dns.hits, dns.misses) == (1, 1)
+
+    def test_expiry(self):
+        dns = connpool.DNSCache(ttl=0)
+        dns.resolve('localhost', 80)
+        dns.resolve('localhost', 80)
+        assert dns.misses == 2
+
+
+class TestYoutubeDL(object):
+    def test_installed(self):
+        pytest.importorskip('youtube_dl')
+        from soundground.cloudman import create_ydl
+        ydl = create_ydl()
+        handlers = [handler for handler in ydl._opener.handlers
+                    if isinstance(handler, urllib.request.HTTPSHandler)]
+        assert handlers
+        assert handlers[0].do_open.func == connpool.shared_pool().do_open
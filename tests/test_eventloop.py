@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+import threading
+
+from soundground.eventloop import EventLoop
+
+
+class TestEventLoop(object):
+    def test_timers_in_order(self):
+        loop = EventLoop()
+        calls = []
+        loop.call_later(0.02, calls.append, 2)
+        loop.call_later(0.01, calls.append, 1)
+        cancelled = loop.call_later(0.01, calls.append, 'cancelled')
+        cancelled.cancel()
+        loop.call_later(0.03, loop.stop)
+        loop.run()
+        loop.close()
+        assert calls == [1, 2]
+
+    def test_wakeup_from_thread(self):
+        loop = EventLoop()
+        calls = []
+
+        def post():
+            time.sleep(0.01)
+            loop.call_soon_threadsafe(calls.append, threading.current_thread())
+            loop.call_soon_threadsafe(loop.stop)
+
+        thread = threading.Thread(target=post)
+        thread.start()
+        start = time.monotonic()
+        # Blocks without any timers until the other thread posts
+        loop.run()
+        loop.close()
+        thread.join()
+        assert calls == [thread]
+        assert time.monotonic() - start < 1
+
+    def test_reader(self):
+        loop = EventLoop()
+        r, w = os.pipe()
+        received = []
+
+        def on_read():
+            received.append(os.read(r, 10))
+            loop.stop()
+
+        loop.add_reader(r, on_read)
+        os.write(w, b'x')
+        loop.run()
+        loop.close()
+        os.close(r)
+        os.close(w)
+        assert received == [b'x']
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+import tracemalloc
+
+from soundground.items import ListItem
+from soundground.playman import PlaylistManager
+
+
+class TestListItem(object):
+    def test_no_dict(self):
+        item = ListItem('caption')
+        assert not hasattr(item, '__dict__')
+        assert item.value == 'caption'
+        assert item.info is None
+
+    def test_interned(self):
+        a = ListItem(''.join(['artist/', 'track']))
+        b = ListItem(''.join(['artist/', 'track']))
+        assert a.caption is b.caption
+
+    def test_footprint(self):
+        # Strings are shared, so this only measures the items themselves
+        n = 10000
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        items = [ListItem('caption', True, 'value') for _ in range(n)]
+        per_item = (tracemalloc.get_traced_memory()[0] - before) / n
+        tracemalloc.stop()
+        assert len(items) == n
+        # Documented footprint is 72 bytes, leave room for the list itself
+        assert per_item <= 90
+
+    def test_tracklist(self):
+        manager = PlaylistManager()
+        item = ListItem('artist/track')
+        manager.queue(item)
+        manager.queue('artist/other')
+        assert manager.tracklist[0] is item
+        assert manager.tracklist[1].value == 'artist/other'
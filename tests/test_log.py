@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+import os
+import logging
+import threading
+
+from soundground import log
+
+
+class TestLog(object):
+    def test_disabled_by_default(self):
+        logger = log.get_logger('cloudman')
+        assert logger.name == 'soundground.cloudman'
+        assert not logger.isEnabledFor(logging.ERROR)
+
+    def test_writes_from_threads(self, tmpdir):
+        path = log.setup('info', str(tmpdir.join('logs', 'debug.log')))
+        logger = log.get_logger('test')
+        try:
+            def write(n):
+                for i in range(100):
+                    logger.info('thread %d line %d', n, i)
+                    logger.debug('hidden')
+
+            threads = [threading.Thread(target=write, args=(n,))
+                       for n in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            log.shutdown()
+
+        with open(path) as log_file:
+            lines = log_file.read().splitlines()
+        assert len(lines) == 400
+        assert 'thread 3 line 99' in ''.join(lines)
+        assert 'hidden' not in ''.join(lines)
+        assert not logger.isEnabledFor(logging.ERROR)
+
+    def test_rotation(self, tmpdir):
+        path = log.setup('debug', str(tmpdir.join('debug.log')),
+                         max_bytes=2000, backups=2)
+        try:
+            for i in range(200):
+                log.get_logger('test').debug('line %d', i)
+        finally:
+            log.shutdown()
+        assert os.path.getsize(path) <= 2000
+        assert os.path.exists(path + '.1')
+        assert os.path.exists(path + '.2')
+        assert not os.path.exists(path + '.3')
+
+    def test_expands_home(self, tmpdir, monkeypatch):
+        monkeypatch.setenv('HOME', str(tmpdir))
+        path = log.setup('debug', '~/.soundground/debug.log')
+        log.shutdown()
+        assert path == str(tmpdir.join('.soundground', 'debug.log'))
@@ -1,4 +1,14 @@
 # -*- coding: utf-8 -*-
+import os
+import pty
+import sys
+import json
+import fcntl
+import select
+import struct
+import termios
+import subprocess
+
 from pytest import raises
 
 # The parametrize function is generated, so this doesn't work:
@@ -36,3 +46,64 @@ class TestMain(object):
         assert err == '{0} {1}\n'.format(metadata.project, metadata.version)
         # Should exit with zero return code.
         assert exc_info.value.code == 0
+
+
+# Time from interpreter start until the first frame is painted
+FIRST_FRAME_BUDGET = 0.5
+
+FIRST_FRAME_SCRIPT = """
+import time
+start = time.perf_counter()
+
+import sys, json, curses
+from soundground import main, utils
+
+timer = utils.PhaseTimer(start)
+timer.mark('import main')
+
+def first_frame(stdscr):
+    main.init_screen(stdscr)
+    timer.mark('first frame')
+
+curses.wrapper(first_frame)
+with open(sys.argv[1], 'w') as result:
+    json.dump({
+        'first_frame': timer.elapsed('first frame'),
+        'modules': sorted(sys.modules),
+    }, result)
+"""
+
+
+class TestStartup(object):
+    def test_first_frame_budget(self, tmpdir):
+        result = tmpdir.join('result.json')
+        env = dict(os.environ, HOME=str(tmpdir), TERM='xterm',
+                   PYTHONPATH=os.path.dirname(os.path.dirname(__file__)))
+
+        # curses needs a terminal, give it a pseudo-terminal
+        master, slave = pty.openpty()
+        fcntl.ioctl(slave, termios.TIOCSWINSZ, struct.pack('HHHH', 24, 80, 0, 0))
+        try:
+            proc = subprocess.Popen(
+                [sys.executable, '-c', FIRST_FRAME_SCRIPT, str(result)],
+                stdin=slave, stdout=slave, stderr=slave, env=env)
+            os.close(slave)
+            # Drain the screen output so the child never blocks on writes
+            while proc.poll() == None:
+                if select.select([master], [], [], 0.1)[0]:
+                    try:
+                        os.read(master, 65536)
+                    except OSError:
+                        break
+            assert proc.wait(timeout=10) == 0
+        finally:
+            os.close(master)
+
+        stats = json.loads(result.read())
+        # Heavy modules must not be loaded before the first frame
+        assert 'vlc' not in stats['modules']
+        assert 'youtube_dl' not in stats['modules']
+        # Neither is cloudman, with its process pool and sqlite dependencies
+        assert 'soundground.cloudman' not in stats['modules']
+        assert 'sqlite3' not in stats['modules']
+        assert stats['first_frame'] < FIRST_FRAME_BUDGET
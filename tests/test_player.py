@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+import vlc
+
+from soundground.player import Player
+
+
+class FakeMedia(object):
+    def __init__(self, url):
+        self.url = url
+        self.options = []
+
+    def add_option(self, option):
+        self.options.append(option)
+
+
+class FakeEvent(object):
+    class u(object):
+        new_position = 0.0
+        new_length = 0
+
+    def __init__(self, event_type):
+        self.type = event_type
+
+
+class FakeMediaPlayer(object):
+    def __init__(self):
+        self.media = None
+        self.state = 'stopped'
+        self.volume = 100
+        self.callbacks = {}
+
+    def event_manager(self):
+        return self
+
+    def event_attach(self, event_type, callback, *args):
+        self.callbacks.setdefault(event_type, []).append((callback, args))
+
+    def emit(self, event_type):
+        for callback, args in self.callbacks.get(event_type, []):
+            callback(FakeEvent(event_type), *args)
+
+    def set_media(self, media):
+        self.media = media
+
+    def play(self):
+        if ':start-paused' in self.media.options:
+            self.state = 'paused'
+        else:
+            self.state = 'playing'
+
+    def set_pause(self, paused):
+        self.state = 'paused' if paused else 'playing'
+
+    def stop(self):
+        self.state = 'stopped'
+
+    def audio_set_volume(self, volume):
+        self.volume = volume
+
+    def get_length(self):
+        return 1000
+
+
+class FakeInstance(object):
+    def media_new(self, url):
+        return FakeMedia(url)
+
+    def media_player_new(self):
+        return FakeMediaPlayer()
+
+
+class ImmediateLoop(object):
+    def call_soon_threadsafe(self, callback, *args):
+        callback(*args)
+
+
+def make_player():
+    return Player(FakeInstance(), ImmediateLoop())
+
+
+class TestPlayer(object):
+    def test_preload_is_paused(self):
+        player = make_player()
+        player.play_url('a')
+        player.preload('b')
+        first, second = player.players
+        assert first.state == 'playing'
+        assert second.state == 'paused'
+        assert second.media.url == 'b'
+
+    def test_hand_off_at_end(self):
+        player = make_player()
+        advanced = []
+        player.on_advance.append(advanced.append)
+        ended = []
+        player.event_attach(vlc.EventType.MediaPlayerEndReached, ended.append)
+
+        player.play_url('a')
+        player.preload('b')
+        first, second = player.players
+        first.emit(vlc.EventType.MediaPlayerEndReached)
+
+        # The standby player took over without reporting the end
+        assert player.player is second
+        assert second.state == 'playing'
+        assert first.state == 'stopped'
+        assert advanced == ['b']
+        assert ended == []
+
+    def test_play_preloaded_url(self):
+        player = make_player()
+        advanced = []
+        player.on_advance.append(advanced.append)
+        player.play_url('a')
+        player.preload('b')
+        player.play_url('b')
+        assert player.player.media.url == 'b'
+        assert player.player.state == 'playing'
+        assert advanced == []
+
+    def test_end_without_preload(self):
+        player = make_player()
+        ended = []
+        player.event_attach(vlc.EventType.MediaPlayerEndReached, ended.append)
+        player.play_url('a')
+        player.player.emit(vlc.EventType.MediaPlayerEndReached)
+        assert len(ended) == 1
+
+    def test_standby_events_hidden(self):
+        player = make_player()
+        events = []
+        player.event_attach(vlc.EventType.MediaPlayerPlaying, events.append)
+        player.preload('b')
+        player.standby.emit(vlc.EventType.MediaPlayerPlaying)
+        assert events == []
+        player.player.emit(vlc.EventType.MediaPlayerPlaying)
+        assert len(events) == 1
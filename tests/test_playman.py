@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+import time
+import threading
+
+from soundground.items import ListItem
+from soundground.playman import PlaylistManager
+
+
+class FakeCloud(object):
+    def __init__(self):
+        self.calls = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def stream_info(self, url, margin=0, wait=True):
+        self.release.wait()
+        self.calls.append((url, threading.current_thread()))
+        return {'title': url, 'url': url + '/stream'}
+
+
+class FakePlayer(object):
+    def __init__(self):
+        self.mrl = None
+        self.preloaded = None
+        self.on_advance = []
+
+    def play_url(self, url):
+        self.mrl = url
+
+    def preload(self, url):
+        self.preloaded = url
+
+
+def make_manager(n=10, lookahead=3):
+    cloud = FakeCloud()
+    manager = PlaylistManager(cloud, FakePlayer(), lookahead)
+    manager.load([ListItem('track{}'.format(i)) for i in range(n)])
+    return cloud, manager
+
+
+class TestPlaylistManager(object):
+    def test_lookahead(self):
+        cloud, manager = make_manager()
+        manager.pool.join()
+        assert sorted(url for url, _ in cloud.calls) == ['track1', 'track2', 'track3']
+        assert all(thread is not threading.current_thread()
+                   for _, thread in cloud.calls)
+
+    def test_next_uses_prefetched(self):
+        cloud, manager = make_manager()
+        manager.play()
+        manager.pool.join()
+        del cloud.calls[:]
+
+        assert manager.next()
+        assert manager.player.mrl == 'track1/stream'
+        # Nothing was resolved on the calling thread
+        assert threading.current_thread() not in [t for _, t in cloud.calls]
+        manager.pool.join()
+        assert [url for url, _ in cloud.calls] == ['track4']
+
+    def test_joins_pending_lookup(self):
+        cloud = FakeCloud()
+        cloud.release.clear()
+        manager = PlaylistManager(cloud, FakePlayer(), 1)
+        items = [ListItem('track{}'.format(i)) for i in range(3)]
+        items[0].info = {'url': 'track0/stream'}
+        manager.load(items)
+        manager.play(0)
+
+        # track1 is still being resolved in the background, next() waits for it
+        threading.Timer(0.05, cloud.release.set).start()
+        assert manager.next()
+        assert [url for url, _ in cloud.calls].count('track1') == 1
+
+    def test_end_of_list(self):
+        cloud, manager = make_manager(n=2)
+        assert manager.play(1)
+        assert not manager.next()
+
+    def test_preloads_next(self):
+        cloud, manager = make_manager()
+        manager.play(0)
+        manager.pool.join()
+        assert manager.player.preloaded == 'track1/stream'
+
+    def test_follows_hand_off(self):
+        cloud, manager = make_manager()
+        manager.play(0)
+        manager.pool.join()
+        for callback in manager.player.on_advance:
+            callback('track1/stream')
+        assert manager.play_index == 1
+        manager.pool.join()
+        assert manager.player.preloaded == 'track2/stream'
+
+    def test_reresolves_expiring_url(self):
+        cloud, manager = make_manager(n=3, lookahead=0)
+        manager.tracklist[0].info = {'url': 'old', 'expires': time.time() + 5}
+        manager.play(0)
+        # Expires within the refresh margin, so it was resolved again
+        assert manager.player.mrl == 'track0/stream'
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+import json
+
+from soundground import stats
+from soundground.audiocache import AudioCache
+from soundground.workers import WorkerPool
+
+
+class FakeDownloadError(Exception):
+    def __init__(self, message, exc_info):
+        super(FakeDownloadError, self).__init__(message)
+        self.exc_info = exc_info
+
+
+class TestHistogram(object):
+    def test_percentiles(self):
+        histogram = stats.Histogram()
+        for _ in range(90):
+            histogram.add(0.003)
+        for _ in range(10):
+            histogram.add(0.8)
+        assert histogram.count == 100
+        assert histogram.percentile(0.5) == 5
+        assert histogram.percentile(0.95) == 800
+        assert histogram.to_dict()['buckets_ms']['<=1000'] == 10
+
+    def test_open_bucket(self):
+        histogram = stats.Histogram()
+        histogram.add(60)
+        assert histogram.percentile(0.5) == 60000
+
+
+class TestFetchStats(object):
+    def test_errors_by_type(self):
+        fetch_stats = stats.FetchStats()
+        fetch_stats.record('process_url', 0.1, 100)
+        fetch_stats.record('process_url', 0.2, error=ValueError('bad'))
+        wrapped = FakeDownloadError('ERROR: timed out',
+                                    (TimeoutError, TimeoutError(), None))
+        fetch_stats.record('process_url', 0.2, error=wrapped)
+        operation = fetch_stats.snapshot()['operations']['process_url']
+        assert operation['count'] == 3
+        assert operation['bytes'] == 100
+        assert operation['errors'] == {'ValueError': 1, 'TimeoutError': 1}
+
+    def test_queue_wait_and_load(self, tmpdir):
+        fetch_stats = stats.FetchStats()
+        pool = WorkerPool(2, 'fetch', fetch_stats)
+        for _ in range(10):
+            pool.submit(lambda: None)
+        pool.join()
+        snapshot = fetch_stats.snapshot([pool])
+        assert snapshot['queue_wait']['fetch']['count'] == 10
+        assert snapshot['workers']['fetch'] == {'busy': 0, 'size': 2,
+                                                'queued': 0}
+        pool.shutdown()
+
+        path = fetch_stats.dump(str(tmpdir.join('stats', 'fetch.json')), [pool])
+        with open(path) as stats_file:
+            assert json.load(stats_file)['queue_wait']['fetch']['count'] == 10
+
+    def test_text(self):
+        fetch_stats = stats.FetchStats()
+        assert stats.summary(fetch_stats.snapshot()) == 'No fetches yet'
+        fetch_stats.record('fetch_url', 0.5, error=IOError('x'))
+        snapshot = fetch_stats.snapshot()
+        assert 'fetch_url 1x' in stats.summary(snapshot)
+        assert '  error OSError x1' in stats.report(snapshot)
+
+    def test_audio_cache(self, tmpdir):
+        fetch_stats = stats.FetchStats()
+        audio_cache = AudioCache(str(tmpdir.join('audio')))
+        audio_cache.get('https://soundcloud.com/artist/track')
+        snapshot = fetch_stats.snapshot(audio_cache=audio_cache)
+        assert snapshot['audio_cache']['misses'] == 1
+        assert any(line.startswith('audio cache: 0 hits, 1 misses')
+                   for line in stats.report(snapshot))
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+import time
+import socket
+import threading
+import urllib.error
+
+from soundground import throttle
+from soundground.cloudman import ExtractionError
+
+
+class FakeDownloadError(Exception):
+    def __init__(self, message, exc_info):
+        super(FakeDownloadError, self).__init__(message)
+        self.exc_info = exc_info
+
+
+def http_error(code):
+    return urllib.error.HTTPError('https://soundcloud.com/x', code, 'error',
+                                  {}, None)
+
+
+class TestClassify(object):
+    def test_http_status(self):
+        assert throttle.classify(http_error(503)) == throttle.TRANSIENT
+        assert throttle.classify(http_error(429)) == throttle.TRANSIENT
+        assert throttle.classify(http_error(404)) == throttle.PERMANENT
+        assert throttle.classify(http_error(400)) is None
+
+    def test_wrapped(self):
+        cause = http_error(410)
+        error = FakeDownloadError('ERROR: gone', (type(cause), cause, None))
+        assert throttle.http_status(error) == 410
+        assert throttle.classify(error) == throttle.PERMANENT
+
+    def test_message(self):
+        error = Exception('HTTP Error 503: Service Unavailable')
+        assert throttle.classify(error) == throttle.TRANSIENT
+
+    def test_network_errors(self):
+        assert throttle.classify(socket.timeout()) == throttle.TRANSIENT
+        assert throttle.classify(ConnectionResetError()) == throttle.TRANSIENT
+        url_error = urllib.error.URLError(ConnectionRefusedError())
+        assert throttle.classify(url_error) == throttle.TRANSIENT
+        assert throttle.classify(ValueError('bad')) is None
+
+    def test_worker_process_errors(self):
+        error = ExtractionError('timed out', 'TimeoutError')
+        assert throttle.classify(error) == throttle.TRANSIENT
+
+
+class TestBackoff(object):
+    def test_bounds(self):
+        for attempt in range(10):
+            delay = throttle.backoff(attempt, 1.0, 30.0)
+            assert 0 <= delay <= min(30.0, 2 ** attempt)
+
+    def test_jitter(self):
+        delays = {throttle.backoff(3) for _ in range(20)}
+        assert len(delays) > 1
+
+
+class TestTokenBucket(object):
+    def test_burst(self):
+        bucket = throttle.TokenBucket(100, burst=5)
+        start = time.monotonic()
+        for _ in range(5):
+            bucket.acquire()
+        assert time.monotonic() - start < 0.05
+        assert bucket.waited == 0
+
+    def test_rate(self):
+        bucket = throttle.TokenBucket(100, burst=1)
+        start = time.monotonic()
+        for _ in range(6):
+            bucket.acquire()
+        assert time.monotonic() - start >= 0.04
+        assert bucket.waited > 0
+
+    def test_unlimited(self):
+        bucket = throttle.TokenBucket(0)
+        for _ in range(1000):
+            bucket.acquire()
+        assert bucket.waited == 0
+
+
+class TestCircuitBreaker(object):
+    def test_trips_after_failures_in_a_row(self):
+        breaker = throttle.CircuitBreaker(3, 60)
+        breaker.failure()
+        breaker.failure()
+        breaker.success()
+        assert not breaker.failure()
+        assert not breaker.failure()
+        assert breaker.state == 'closed'
+        assert breaker.failure()
+        assert breaker.state == 'open'
+        assert breaker.trips == 1
+        assert not breaker.wait(0.01)
+
+    def test_probe(self):
+        breaker = throttle.CircuitBreaker(1, 0.05)
+        breaker.failure()
+        assert breaker.wait()
+        assert breaker.state == 'half-open'
+
+        # Others wait for the probe
+        waiter = threading.Thread(target=breaker.wait)
+        waiter.start()
+        waiter.join(0.1)
+        assert waiter.is_alive()
+
+        breaker.success()
+        waiter.join(1)
+        assert not waiter.is_alive()
+        assert breaker.state == 'closed'
+
+    def test_failed_probe_reopens(self):
+        breaker = throttle.CircuitBreaker(5, 0.05)
+        for _ in range(5):
+            breaker.failure()
+        assert breaker.wait()
+        assert breaker.failure()
+        assert breaker.state == 'open'
+        assert breaker.trips == 2
+
+    def test_disabled(self):
+        breaker = throttle.CircuitBreaker(0)
+        for _ in range(100):
+            assert not breaker.failure()
+        assert breaker.wait(0)
+
+
+class TestNegativeCache(object):
+    def test_expiry(self):
+        cache = throttle.NegativeCache(ttl=0.05)
+        cache.put('track', 'HTTP Error 404')
+        assert cache.get('track') == 'HTTP Error 404'
+        time.sleep(0.06)
+        assert cache.get('track') is None
+        assert len(cache) == 0
+
+    def test_remove(self):
+        cache = throttle.NegativeCache()
+        cache.put('track', 'gone')
+        cache.remove('track')
+        assert cache.get('track') is None
+
+    def test_bounded(self):
+        cache = throttle.NegativeCache(max_entries=10)
+        for i in range(25):
+            cache.put('track{}'.format(i), 'gone')
+        assert len(cache) <= 10
+        assert cache.get('track24') == 'gone'
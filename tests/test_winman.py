@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+import threading
+
+import pytest
+
+from soundground import utils
+from soundground import winman as wm
+from soundground.eventloop import EventLoop
+from benchmarks.fakes import FakeWindow
+
+
+def make_list(n, height=10):
+    window = FakeWindow(height, 40)
+    selectable = wm.SelectableList(window)
+    selectable.active = True
+    selectable.add_many(['item {}'.format(i) for i in range(n)])
+    return window, selectable
+
+
+class TestSelectableList(object):
+    def test_bulk_add_draws_visible_rows_only(self):
+        window, selectable = make_list(1000)
+        assert window.writes == 10
+        assert window.lines[9] == 'item 9'
+
+    def test_add_below_viewport_is_free(self):
+        window, selectable = make_list(100)
+        window.writes = 0
+        selectable.add('another')
+        assert window.writes == 0
+
+    def test_selection_repaints_two_rows(self):
+        window, selectable = make_list(100)
+        window.writes = 0
+        selectable.select(1)
+        assert window.writes == 2
+
+    def test_scroll_shifts_rows(self):
+        window, selectable = make_list(100)
+        selectable.select(9, False)
+        window.writes = 0
+        selectable.select(1)
+        assert window.scrolls == 1
+        # Newly exposed row plus the old and new highlight
+        assert window.writes <= 3
+        assert window.lines == ['item {}'.format(i) for i in range(1, 11)]
+
+    def test_changed_caption(self):
+        window, selectable = make_list(100)
+        window.writes = 0
+        selectable.items[3].caption = 'renamed'
+        selectable.draw()
+        assert window.writes == 1
+        assert window.lines[3] == 'renamed'
+
+    def test_no_selectable_rows(self):
+        window, selectable = make_list(0)
+        selectable.replace_items(['report line {}'.format(i) for i in range(5)],
+                                 False)
+        assert selectable.select(1) is False
+        assert selectable.select(-1) is False
+
+    def test_skips_unselectable_rows(self):
+        window, selectable = make_list(0)
+        selectable.add('track')
+        selectable.add_many(['message', 'message'], False)
+        # Nothing selectable below, turns back
+        selectable.select(1)
+        assert selectable.selected == 0
+        selectable.add('last')
+        selectable.select(1)
+        assert selectable.selected == 3
+
+    def test_replace_items(self):
+        window, selectable = make_list(100)
+        selectable.replace_items(['only'])
+        assert window.lines == ['only'] + [''] * 9
+        assert selectable.selected == 0
+
+
+class Drawable(object):
+    def __init__(self):
+        self.draws = 0
+        self.threads = set()
+
+    def draw(self):
+        self.draws += 1
+        self.threads.add(threading.current_thread())
+
+
+class TestUpdateQueue(object):
+    def test_immediate_without_loop(self):
+        target = Drawable()
+        values = []
+        updates = wm.UpdateQueue()
+        updates.post(values.append, 1, target=target)
+        assert values == [1]
+        assert target.draws == 1
+
+    def test_batches_on_loop_thread(self):
+        loop = EventLoop()
+        target = Drawable()
+        values = []
+        updates = wm.UpdateQueue(loop, fps=30)
+
+        def worker(n):
+            for i in range(100):
+                updates.post(values.append, (n, i), target=target)
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        loop.call_later(0.1, loop.stop)
+        loop.run()
+        loop.close()
+        assert len(values) == 400
+        assert target.draws == updates.flushes
+        assert target.draws <= 5
+        assert target.threads == {threading.current_thread()}
+
+    def test_failing_update(self):
+        target = Drawable()
+        values = []
+        updates = wm.UpdateQueue()
+        updates.updates.append((lambda: 1 / 0, (), target))
+        updates.post(values.append, 1, target=target)
+        assert values == [1]
+        assert target.draws == 1
+
+
+class FakePlayer(object):
+    def __init__(self):
+        self.calls = 0
+
+    def __getattr__(self, name):
+        values = {'is_playing': True, 'get_title': 'title', 'get_length': 200000,
+                  'get_position': 0.5, 'audio_get_volume': 100}
+
+        def getter():
+            self.calls += 1
+            return values[name]
+        return getter
+
+
+class TestStatusLine(object):
+    def test_repaints_only_on_change(self):
+        window = FakeWindow(1, 80)
+        player = FakePlayer()
+        statusline = wm.StatusLine(window, player)
+        statusline.refresh_state()
+        assert window.lines[0] == u'[ ▶ ] title [01:40/03:20] | Vol: 100'
+        calls = player.calls
+        window.writes = 0
+
+        # Sub-second position changes don't change the text
+        statusline._on_position(0.501)
+        statusline.draw()
+        assert window.writes == 0
+        assert player.calls == calls
+
+        statusline._on_position(0.6)
+        assert window.writes == 1
+
+    def test_notify(self):
+        window = FakeWindow(1, 80)
+        statusline = wm.StatusLine(window, FakePlayer())
+        statusline.notify('hello')
+        assert window.lines[0] == 'hello'
+        statusline.dismiss()
+        assert window.lines[0] != 'hello'
+
+
+class TestFormatMillis(object):
+    @pytest.mark.parametrize('millis,expected', [
+        (0, '00:00'),
+        (-1, '00:00'),
+        (61000, '01:01'),
+        (3599999, '59:59'),
+        (3600000, '1:00:00'),
+        (45296000, '12:34:56'),
+    ])
+    def test_format(self, millis, expected):
+        assert utils.format_millis(millis) == expected
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+import time
+import threading
+
+from pytest import raises
+
+from soundground import stats
+from soundground.workers import WorkerPool, SingleFlight
+
+
+class TestWorkerPool(object):
+    def test_runs_all_jobs(self):
+        pool = WorkerPool(3)
+        jobs = [pool.submit(lambda x: x * 2, i) for i in range(50)]
+        pool.join()
+        assert [job.result for job in jobs] == [i * 2 for i in range(50)]
+        assert len(pool.workers) == 3
+        pool.shutdown()
+
+    def test_reuses_threads(self):
+        pool = WorkerPool(2)
+        names = set()
+        for _ in range(20):
+            pool.submit(lambda: names.add(threading.current_thread().name))
+        pool.join()
+        assert len(names) <= 2
+        pool.shutdown()
+
+    def test_job_error(self):
+        pool = WorkerPool(1)
+        job = pool.submit(lambda: 1 / 0)
+        with raises(ZeroDivisionError):
+            job.wait()
+        pool.shutdown()
+
+    def test_priority_order(self):
+        pool = WorkerPool(1)
+        started = threading.Event()
+        release = threading.Event()
+        order = []
+        pool.submit(lambda: (started.set(), release.wait()))
+        started.wait()
+
+        # Queued while the only worker is busy
+        for priority in (3, 1, 2, 1):
+            pool.submit(order.append, priority, priority=priority)
+        release.set()
+        pool.join()
+        assert order == [1, 1, 2, 3]
+        pool.shutdown()
+
+    def test_cancel(self):
+        pool = WorkerPool(1)
+        started = threading.Event()
+        release = threading.Event()
+        order = []
+        pool.submit(lambda: (started.set(), release.wait()))
+        started.wait()
+
+        jobs = [pool.submit(order.append, i, priority=i) for i in range(10)]
+        assert pool.cancel(lambda job: job.args[0] % 2) == 5
+        assert jobs[1].done() and jobs[1].cancelled
+        assert jobs[1].wait() is None
+        release.set()
+        pool.join()
+        assert order == [0, 2, 4, 6, 8]
+
+        # join returns when everything left was cancelled
+        started.clear()
+        release.clear()
+        pool.submit(lambda: (started.set(), release.wait()))
+        started.wait()
+        pool.submit(order.append, 10)
+        assert pool.cancel() == 1
+        release.set()
+        pool.join()
+        assert order == [0, 2, 4, 6, 8]
+        pool.shutdown()
+
+
+class TestSingleFlight(object):
+    def run_concurrently(self, flight, key, func, n=5):
+        results = []
+        threads = [threading.Thread(
+            target=lambda: results.append(flight.do('op', key, func)))
+            for _ in range(n)]
+        for thread in threads:
+            thread.start()
+        return threads, results
+
+    def test_shares_result(self):
+        fetch_stats = stats.FetchStats()
+        flight = SingleFlight(fetch_stats)
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def slow():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return {'title': 'track'}
+
+        threads, results = self.run_concurrently(flight, 'track', slow)
+        assert started.wait(5)
+        # Let every caller join before the call finishes
+        deadline = time.monotonic() + 5
+        while (fetch_stats.operations['op'].coalesced < 4 and
+               time.monotonic() < deadline):
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join()
+        assert calls == [1]
+        assert len(results) == 5
+        assert all(result is results[0] for result in results)
+        assert flight.calls == {}
+
+    def test_shares_error(self):
+        flight = SingleFlight()
+        with raises(ZeroDivisionError):
+            flight.do('op', 'key', lambda: 1 / 0)
+        # Finished calls aren't remembered
+        assert flight.do('op', 'key', lambda: 2) == 2